@@ -0,0 +1,66 @@
+"""create base tables
+
+Revision ID: 0a1b7c3d5e92
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a1b7c3d5e92'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The tables as they were before migrations were tracked; databases that already have
+    # them should run `alembic stamp 0a1b7c3d5e92` once instead of applying this revision
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('image', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username'),
+        sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_user_id'), 'user', ['id'], unique=False)
+    op.create_table(
+        'user_image',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('image_type', sa.Enum('FRONT', 'SIDE', name='imagetype'), nullable=False),
+        sa.Column('image_url', sa.String(length=500), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_image_id'), 'user_image', ['id'], unique=False)
+    op.create_table(
+        'product',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('image', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_product_id'), 'product', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_product_id'), table_name='product')
+    op.drop_table('product')
+    op.drop_index(op.f('ix_user_image_id'), table_name='user_image')
+    op.drop_table('user_image')
+    sa.Enum(name='imagetype').drop(op.get_bind(), checkfirst=True)
+    op.drop_index(op.f('ix_user_id'), table_name='user')
+    op.drop_table('user')
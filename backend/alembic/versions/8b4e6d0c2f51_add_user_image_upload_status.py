@@ -0,0 +1,39 @@
+"""add user_image upload status
+
+Revision ID: 8b4e6d0c2f51
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4e6d0c2f51'
+down_revision: Union[str, Sequence[str], None] = '3f1c2a9d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+upload_status = sa.Enum('PENDING', 'UPLOADED', 'FAILED', name='uploadstatus')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    upload_status.create(op.get_bind(), checkfirst=True)
+    # Existing rows were uploaded before they were written
+    # Batch mode so the column change also works on SQLite (plain ALTERs elsewhere)
+    with op.batch_alter_table('user_image') as batch_op:
+        batch_op.add_column(sa.Column('status', upload_status, nullable=False, server_default='UPLOADED'))
+        batch_op.alter_column('image_url', existing_type=sa.String(length=500), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM user_image WHERE image_url IS NULL")
+    with op.batch_alter_table('user_image') as batch_op:
+        batch_op.alter_column('image_url', existing_type=sa.String(length=500), nullable=False)
+        batch_op.drop_column('status')
+    upload_status.drop(op.get_bind(), checkfirst=True)
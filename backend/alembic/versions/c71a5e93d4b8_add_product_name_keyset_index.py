@@ -0,0 +1,28 @@
+"""add product name keyset index
+
+Revision ID: c71a5e93d4b8
+Revises: 8b4e6d0c2f51
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71a5e93d4b8'
+down_revision: Union[str, Sequence[str], None] = '8b4e6d0c2f51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_product_name_id', 'product', ['name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_name_id', table_name='product')
@@ -0,0 +1,28 @@
+"""add user_image user_id image_type index
+
+Revision ID: e2d94b7a1c36
+Revises: c71a5e93d4b8
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d94b7a1c36'
+down_revision: Union[str, Sequence[str], None] = 'c71a5e93d4b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_user_image_user_id_image_type', 'user_image', ['user_id', 'image_type'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_image_user_id_image_type', table_name='user_image')
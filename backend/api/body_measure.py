@@ -1,4 +1,4 @@
-from fastapi import APIRouter, File, UploadFile, Form, BackgroundTasks
+from fastapi import APIRouter, File, UploadFile, Form
 from services.body_measure_service import (
     predict_mediapipe_service,
     predict_yolo_service,
@@ -30,10 +30,9 @@ async def predict_yolo(
 
 @router.post("/detect-fullbody")
 async def detect_fullbody(
-    image: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    image: UploadFile = File(...)
 ):
-    return await detect_fullbody_service(image, background_tasks)
+    return await detect_fullbody_service(image)
 
 @router.post("/predict-avg")
 async def predict_avg(
@@ -1,52 +1,48 @@
 import os
-import uuid
-import shutil
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Query
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
 
-from database import get_db, Product
+from database import get_async_db, Product
 from models import ProductCreate, ProductResponse
+from utils.upload_utils import UPLOAD_FOLDER, save_image_upload
+from utils.pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT, keyset_page, page_response, parse_fields
 
 router = APIRouter()
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-def allowed_file(filename: str) -> bool:
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 @router.post("/", response_model=ProductResponse)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
     db_product = Product(name=product.name, price=product.price, description=product.description)
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    # Sessions don't expire on commit, so the inserted row needs no refresh query
+    await db.commit()
     return db_product
 
-@router.get("/", response_model=List[ProductResponse])
-async def list_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
-    return products
+@router.get("/")
+async def list_products(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: Literal["id", "name"] = "id",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Products ordered by `sort`, `limit` at a time; pass `next_cursor` back as `cursor` for the next page.
+    `fields` is a comma-separated subset of the product fields."""
+    fields = parse_fields(fields, list(ProductResponse.model_fields))
+    items, next_cursor = await keyset_page(db, Product, fields, sort, limit, cursor)
+    return page_response(items, next_cursor)
 
 @router.post("/{product_id}/upload_image")
-async def upload_product_image(product_id: int, image: UploadFile = File(...), db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    if not allowed_file(image.filename):
-        raise HTTPException(status_code=400, detail="Invalid file type")
+async def upload_product_image(product_id: int, image: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    # One UPDATE checks that the product exists and sets the image
+    filename = await save_image_upload(image)
     
-    file_extension = image.filename.split('.')[-1]
-    filename = f"product_{product_id}_{uuid.uuid4().hex}.{file_extension}"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
-    
-    product.image = filename
-    db.commit()
+    result = await db.execute(update(Product).where(Product.id == product_id).values(image=filename))
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Product not found")
+    await db.commit()
     return {"message": "Image uploaded", "image": filename}
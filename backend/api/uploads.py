@@ -1,14 +1,54 @@
+import asyncio
 import os
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import FileResponse, Response
+from utils.upload_utils import UPLOAD_FOLDER, VARIANTS_FOLDER, HASHED_FILENAME, content_hash, variant_width, make_variant
 
 router = APIRouter()
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+# Hashed filenames never change content, so clients may keep them forever; other names revalidate
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 @router.get("/{filename}")
-async def uploaded_file(filename: str):
+async def uploaded_file(filename: str, request: Request, w: Optional[int] = Query(None, gt=0)):
+    # Dotfiles are spool/variant internals
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
     filepath = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(filepath):
+    try:
+        stat_result = os.stat(filepath)
+    except (FileNotFoundError, NotADirectoryError):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(filepath)
+
+    digest = await asyncio.to_thread(content_hash, filename, filepath, stat_result)
+    etag = f'"{digest}"'
+    if w is not None:
+        width = variant_width(w)
+        etag = f'"{digest}-w{width}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if HASHED_FILENAME.match(filename) else REVALIDATE_CACHE_CONTROL
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if w is not None:
+        ext = "jpg" if filename.endswith((".jpg", ".jpeg")) else "png"
+        variant_path = os.path.join(VARIANTS_FOLDER, f"{digest}_w{width}.{ext}")
+        if not os.path.exists(variant_path):
+            os.makedirs(VARIANTS_FOLDER, exist_ok=True)
+            try:
+                await asyncio.to_thread(make_variant, filepath, variant_path, width)
+            except OSError:
+                raise HTTPException(status_code=400, detail="File is not a resizable image")
+        filepath, stat_result = variant_path, os.stat(variant_path)
+    # FileResponse serves Range/If-Range requests against the ETag above
+    return FileResponse(filepath, headers=headers, stat_result=stat_result)
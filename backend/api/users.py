@@ -1,55 +1,53 @@
 import os
-import uuid
-import shutil
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Query
+from sqlalchemy import select, update, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 
-from database import get_db, User, UserImage
-from models import UserCreate, UserResponse, UserImageCreate, UserImageResponse, ImageType
-from utils.cloudinary_utils import upload_and_save_user_image
+from database import get_async_db, User, UserImage
+from models import UserCreate, UserResponse, UserImageCreate, UserImageResponse, ImageType, UploadStatus
+from utils.upload_utils import UPLOAD_FOLDER, save_image_upload
+from services.upload_queue import upload_queue, UploadQueueFullError
+from utils.pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT, keyset_page, page_response, parse_fields
 
 router = APIRouter()
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-def allowed_file(filename: str) -> bool:
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 @router.post("/", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     db_user = User(username=user.username, email=user.email)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    # Sessions don't expire on commit, so the inserted row needs no refresh query
+    await db.commit()
     return db_user
 
-@router.get("/", response_model=List[UserResponse])
-async def list_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
+@router.get("/")
+async def list_users(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: Literal["id", "username"] = "id",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Users ordered by `sort`, `limit` at a time; pass `next_cursor` back as `cursor` for the next page.
+    `fields` is a comma-separated subset of the user fields."""
+    fields = parse_fields(fields, list(UserResponse.model_fields))
+    items, next_cursor = await keyset_page(db, User, fields, sort, limit, cursor)
+    return page_response(items, next_cursor)
 
 @router.post("/{user_id}/upload_image")
-async def upload_user_image(user_id: int, image: UploadFile = File(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not allowed_file(image.filename):
-        raise HTTPException(status_code=400, detail="Invalid file type")
+async def upload_user_image(user_id: int, image: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    # One UPDATE checks that the user exists and sets the image (a stored file for a missing
+    # user is content-addressed and reused by the next identical upload)
+    filename = await save_image_upload(image)
     
-    file_extension = image.filename.split('.')[-1]
-    filename = f"user_{user_id}_{uuid.uuid4().hex}.{file_extension}"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
-    
-    user.image = filename
-    db.commit()
+    result = await db.execute(update(User).where(User.id == user_id).values(image=filename))
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
+    await db.commit()
     return {"message": "Image uploaded", "image": filename}
 
 @router.post("/{user_id}/upload_body_image", response_model=UserImageResponse)
@@ -57,28 +55,54 @@ async def upload_user_body_image(
     user_id: int, 
     image_type: ImageType, 
     image: UploadFile = File(...), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # The row is written as pending and updated by the upload queue once the image is stored.
+    # The user_id foreign key doubles as the existence check, so no separate lookup is needed.
+    try:
+        filename = await upload_queue.spool(image)
+    except UploadQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    try:
+        user_image = UserImage(user_id=user_id, image_type=image_type, status=UploadStatus.PENDING)
+        db.add(user_image)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        upload_queue.discard(filename)
         raise HTTPException(status_code=404, detail="User not found")
-    
-    if not allowed_file(image.filename):
-        raise HTTPException(status_code=400, detail="Invalid file type")
+    except Exception:
+        await db.rollback()
+        upload_queue.discard(filename)
+        raise
     
     folder = f"users/{user_id}/body_images"
-    result = upload_and_save_user_image(image, user_id, image_type, db, folder)
-    
-    if not result:
-        raise HTTPException(status_code=500, detail="Failed to upload image")
+    try:
+        await upload_queue.submit(filename, folder, user_image.id)
+    except UploadQueueFullError as e:
+        await db.delete(user_image)
+        await db.commit()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     
-    return result
+    return {
+        "id": user_image.id,
+        "user_id": user_image.user_id,
+        "image_type": user_image.image_type,
+        "image_url": user_image.image_url,
+        "status": user_image.status
+    }
 
 @router.get("/{user_id}/images", response_model=List[UserImageResponse])
-async def get_user_images(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def get_user_images(user_id: int, image_type: Optional[ImageType] = None, db: AsyncSession = Depends(get_async_db)):
+    # The outer join returns one row even without images, so existence and images take one query;
+    # selectinload(User.images) would need a second SELECT for the images
+    condition = UserImage.user_id == User.id
+    if image_type is not None:
+        condition = and_(condition, UserImage.image_type == image_type)
+    rows = (await db.execute(
+        select(User.id, UserImage).outerjoin(UserImage, condition).where(User.id == user_id).order_by(UserImage.id)
+    )).all()
+    if not rows:
         raise HTTPException(status_code=404, detail="User not found")
     
-    images = db.query(UserImage).filter(UserImage.user_id == user_id).all()
-    return images
+    return [user_image for _, user_image in rows if user_image is not None]
@@ -1,6 +1,12 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.main import api_router
+from database import async_engine, pool_stats
+from services.pose_pool import pose_pool
+from services.pose_batcher import yolo_batcher
+from services.keypoint_cache import keypoint_cache
+from services.upload_queue import upload_queue
 
 app = FastAPI(title="Sparkathon API")
 
@@ -20,4 +26,26 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "sparkathon-api"}
+    return {
+        "status": "healthy",
+        "service": "sparkathon-api",
+        "pose_models": pose_pool.readiness(),
+        "pose_pool": pose_pool.stats(),
+        "yolo_batcher": yolo_batcher.stats(),
+        "keypoint_cache": keypoint_cache.stats(),
+        "upload_queue": upload_queue.stats(),
+        "database_pool": pool_stats()
+    }
+
+@app.on_event("startup")
+async def startup():
+    # Pose models load on the first measurement request unless POSE_PRELOAD=1; see /health for readiness
+    if pose_pool.resolve_preload(default=False):
+        app.state.pose_warmup = asyncio.create_task(pose_pool.start())
+    await upload_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    pose_pool.shutdown()
+    await upload_queue.shutdown()
+    await async_engine.dispose()
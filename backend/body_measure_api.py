@@ -1,7 +1,13 @@
 
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from api.body_measure import router as body_measure_router
+from services.pose_pool import pose_pool
+from services.pose_batcher import yolo_batcher
+from services.keypoint_cache import keypoint_cache
+from services.upload_queue import upload_queue
 
 app = FastAPI(title="Body Measurement API")
 
@@ -21,7 +27,33 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "body-measurement-api"}
+    return {
+        "status": "healthy",
+        "service": "body-measurement-api",
+        "pose_models": pose_pool.readiness(),
+        "pose_pool": pose_pool.stats(),
+        "yolo_batcher": yolo_batcher.stats(),
+        "keypoint_cache": keypoint_cache.stats(),
+        "upload_queue": upload_queue.stats()
+    }
+
+@app.get("/health/ready")
+async def readiness_check():
+    readiness = pose_pool.readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+@app.on_event("startup")
+async def startup():
+    # Loads pose models in the worker processes without delaying startup, unless POSE_PRELOAD=0;
+    # see /health/ready for readiness
+    if pose_pool.resolve_preload(default=True):
+        app.state.pose_warmup = asyncio.create_task(pose_pool.start())
+    await upload_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    pose_pool.shutdown()
+    await upload_queue.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,8 +1,10 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Enum
+from datetime import datetime
+from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Enum, Text, DateTime, Index
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from models.pydantic_models import ImageType
+from models.pydantic_models import ImageType, UploadStatus
 
 POSTGRES_USER = os.getenv('POSTGRES_USER', 'postgres')
 POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'postgres')
@@ -10,18 +12,47 @@ POSTGRES_DB = os.getenv('POSTGRES_DB', 'sparkathon')
 POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
 
-DATABASE_URL = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
+# DATABASE_URL / ASYNC_DATABASE_URL override the PostgreSQL settings (e.g. SQLite for the tests)
+DATABASE_URL = os.getenv('DATABASE_URL', f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}')
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', f'postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}')
 
-engine = create_engine(DATABASE_URL)
+# Connection pool settings, applied to each engine
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Connections dropped by the server or a proxy are detected on checkout and replaced after DB_POOL_RECYCLE seconds
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+POOL_OPTIONS = {
+    'pool_size': DB_POOL_SIZE,
+    'max_overflow': DB_MAX_OVERFLOW,
+    'pool_timeout': DB_POOL_TIMEOUT,
+    'pool_pre_ping': DB_POOL_PRE_PING,
+    'pool_recycle': DB_POOL_RECYCLE
+}
+
+# API handlers use the async engine; the sync engine serves migrations and background worker threads
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def pool_stats():
+    def stats(pool):
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": DB_MAX_OVERFLOW
+        }
+    return {"async": stats(async_engine.pool), "sync": stats(engine.pool)}
 
 class User(Base):
     __tablename__ = 'user'
@@ -31,23 +62,36 @@ class User(Base):
     email = Column(String(120), unique=True, nullable=False)
     image = Column(String(255))
     
-    images = relationship("UserImage", back_populates="user")
+    # Never lazy-loaded (that would be a query per user); load with selectinload(User.images) when needed
+    images = relationship("UserImage", back_populates="user", lazy="raise")
 
 class UserImage(Base):
     __tablename__ = 'user_image'
+    __table_args__ = (Index('ix_user_image_user_id_image_type', 'user_id', 'image_type'),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
     image_type = Column(Enum(ImageType), nullable=False)
-    image_url = Column(String(500), nullable=False)
+    # Set once the background upload completes
+    image_url = Column(String(500))
+    status = Column(Enum(UploadStatus), nullable=False, default=UploadStatus.UPLOADED)
     
-    user = relationship("User", back_populates="images")
+    user = relationship("User", back_populates="images", lazy="raise")
 
 class Product(Base):
     __tablename__ = 'product'
+    # Keyset pagination by name (ties broken by id); users page by the unique username index
+    __table_args__ = (Index('ix_product_name_id', 'name', 'id'),)
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(120), nullable=False)
     price = Column(Float, nullable=False)
     description = Column(String(255))
     image = Column(String(255))
+
+class KeypointCacheEntry(Base):
+    __tablename__ = 'keypoint_cache'
+    
+    key = Column(String(100), primary_key=True)
+    value = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,3 +1,3 @@
-from .pydantic_models import UserCreate, UserResponse, ProductCreate, ProductResponse, UserImageCreate, UserImageResponse, ImageType
+from .pydantic_models import UserCreate, UserResponse, ProductCreate, ProductResponse, UserImageCreate, UserImageResponse, ImageType, UploadStatus
 
-__all__ = ["UserCreate", "UserResponse", "ProductCreate", "ProductResponse", "UserImageCreate", "UserImageResponse", "ImageType"]
+__all__ = ["UserCreate", "UserResponse", "ProductCreate", "ProductResponse", "UserImageCreate", "UserImageResponse", "ImageType", "UploadStatus"]
@@ -8,6 +8,12 @@ class ImageType(str, Enum):
     SIDE = "side"
 
 
+class UploadStatus(str, Enum):
+    PENDING = "pending"
+    UPLOADED = "uploaded"
+    FAILED = "failed"
+
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -30,7 +36,8 @@ class UserImageResponse(BaseModel):
     id: int
     user_id: int
     image_type: ImageType
-    image_url: str
+    image_url: Optional[str] = None
+    status: UploadStatus
 
 
 class ProductCreate(BaseModel):
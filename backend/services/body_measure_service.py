@@ -1,176 +1,137 @@
-import numpy as np
-import cv2
-from ultralytics import YOLO
-import mediapipe as mp
-from fastapi import UploadFile, BackgroundTasks
+import asyncio
+from fastapi import UploadFile, HTTPException
 from fastapi.responses import JSONResponse
-from utils.body_measure_utils import parse_image, cm_to_inch, distance, elliptical_circumference
-from utils.cloudinary_utils import upload_image_to_cloudinary
+from utils.measurement_engine import PoseLandmark, measure_pose
+from services.pose_pool import pose_pool, PoolBusyError, mediapipe_pose_job, holistic_pose_job, shared_images
+from services.pose_batcher import yolo_batcher
+from services.keypoint_cache import keypoint_cache, image_key
+from services.upload_queue import upload_queue, UploadQueueFullError
 
-# Models
-yolo_model = YOLO("weights/yolov8m-pose.pt")
-mp_pose = mp.solutions.pose
-pose_detector = mp_pose.Pose(static_image_mode=True)
+async def run_backend(backend: str, images):
+    if backend == "mediapipe":
+        return await pose_pool.run(mediapipe_pose_job, *images)
+    return await yolo_batcher.predict(*images)
+
+async def pose_keypoints(images_bytes: list, backends: list):
+    """(original_shape, keypoints) per backend and image. Cached results are reused, so only
+    images a backend hasn't seen are decoded (once, shared by all backends) and run."""
+    keys = {backend: [image_key(data, backend) for data in images_bytes] for backend in backends}
+    results = {backend: await keypoint_cache.get_many(keys[backend]) for backend in backends}
+    missing = {
+        backend: [i for i, value in enumerate(values) if value is None]
+        for backend, values in results.items()
+    }
+    missing = {backend: positions for backend, positions in missing.items() if positions}
+    if missing:
+        needed = sorted({i for positions in missing.values() for i in positions})
+        async with shared_images(*[images_bytes[i] for i in needed]) as images:
+            image_at = dict(zip(needed, images))
+            outputs = await asyncio.gather(*[
+                run_backend(backend, [image_at[i] for i in positions])
+                for backend, positions in missing.items()
+            ])
+        for (backend, positions), output in zip(missing.items(), outputs):
+            for i, value in zip(positions, output):
+                results[backend][i] = value
+                await keypoint_cache.put(keys[backend][i], value)
+    return results
+
+def busy_response(e: PoolBusyError):
+    return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "1"})
+
+def no_person_response():
+    return JSONResponse(status_code=400, content={"error": "No person detected in front image"})
+
+def average_measurements(mediapipe_res: dict, yolo_res: dict):
+    fields = [
+        "shoulder_cm", "shoulder_in", "chest_cm", "chest_in",
+        "waist_cm", "waist_in", "inseam_cm", "inseam_in"
+    ]
+    avg_result = {}
+    for f in fields:
+        v1 = mediapipe_res.get(f)
+        v2 = yolo_res.get(f)
+        if v1 is not None and v2 is not None:
+            avg_result[f] = round((v1 + v2) / 2, 1)
+        else:
+            avg_result[f] = v1 if v1 is not None else v2
+    avg_result["gender"] = mediapipe_res.get("gender") or yolo_res.get("gender")
+    avg_result["height_cm"] = mediapipe_res.get("height_cm") or yolo_res.get("height_cm")
+    avg_result["weight_kg"] = mediapipe_res.get("weight_kg") or yolo_res.get("weight_kg")
+    return avg_result
 
 async def predict_mediapipe_service(front: UploadFile, side: UploadFile, height: int, weight: int = None, gender: str = None):
     try:
-        front_img = parse_image(front)
-        side_img = parse_image(side)
-        front_rgb = cv2.cvtColor(front_img, cv2.COLOR_BGR2RGB)
-        side_rgb = cv2.cvtColor(side_img, cv2.COLOR_BGR2RGB)
-        front_result = pose_detector.process(front_rgb)
-        side_result = pose_detector.process(side_rgb)
-        if not front_result.pose_landmarks:
-            return JSONResponse(status_code=400, content={"error": "No person detected in front image"})
-        lm_f = front_result.pose_landmarks.landmark
-        lm_s = side_result.pose_landmarks.landmark if side_result.pose_landmarks else None
-        H, W, _ = front_img.shape
-        def xy(landmark): return np.array([landmark.x * W, landmark.y * H])
-        shoulder_px = distance(xy(lm_f[mp_pose.PoseLandmark.LEFT_SHOULDER]), xy(lm_f[mp_pose.PoseLandmark.RIGHT_SHOULDER]))
-        chest_px = shoulder_px
-        waist_px = distance(xy(lm_f[mp_pose.PoseLandmark.LEFT_HIP]), xy(lm_f[mp_pose.PoseLandmark.RIGHT_HIP]))
-        inseam_px = distance(xy(lm_f[mp_pose.PoseLandmark.LEFT_HIP]), xy(lm_f[mp_pose.PoseLandmark.LEFT_ANKLE]))
-        height_px = distance(xy(lm_f[mp_pose.PoseLandmark.NOSE]), xy(lm_f[mp_pose.PoseLandmark.LEFT_HEEL]))
-        scale = height / height_px if height_px > 0 else 1
-        chest_depth_px, waist_depth_px = 0, 0
-        if lm_s:
-            chest_depth_px = distance(
-                xy(lm_s[mp_pose.PoseLandmark.LEFT_SHOULDER]),
-                xy(lm_s[mp_pose.PoseLandmark.LEFT_HIP])
-            ) * 0.6
-            waist_depth_px = distance(
-                xy(lm_s[mp_pose.PoseLandmark.LEFT_HIP]),
-                xy(lm_s[mp_pose.PoseLandmark.LEFT_KNEE])
-            ) * 0.5
-        shoulder_cm = shoulder_px * scale
-        chest_cm = elliptical_circumference(chest_px, chest_depth_px) * scale
-        waist_cm = elliptical_circumference(waist_px, waist_depth_px) * scale
-        inseam_cm = inseam_px * scale
-        return {
-            "shoulder_cm": round(shoulder_cm, 1),
-            "shoulder_in": cm_to_inch(shoulder_cm),
-            "chest_cm": round(chest_cm, 1),
-            "chest_in": cm_to_inch(chest_cm),
-            "waist_cm": round(waist_cm, 1),
-            "waist_in": cm_to_inch(waist_cm),
-            "inseam_cm": round(inseam_cm, 1),
-            "inseam_in": cm_to_inch(inseam_cm),
-            "gender": gender.lower() if gender else None,
-            "height_cm": height,
-            "weight_kg": weight if weight is not None else None
-        }
+        front_bytes = await front.read()
+        side_bytes = await side.read()
+        results = await pose_keypoints([front_bytes, side_bytes], ["mediapipe"])
+        front_pose, side_pose = results["mediapipe"]
+        if front_pose[1] is None:
+            return no_person_response()
+        return measure_pose("mediapipe", front_pose, side_pose, height, weight, gender)
+    except PoolBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 async def predict_yolo_service(front: UploadFile, side: UploadFile, height: int, weight: int = None, gender: str = None):
     try:
-        front_img = parse_image(front)
-        side_img = parse_image(side)
-        front_res = yolo_model.predict(source=front_img, imgsz=640, verbose=False)
-        side_res = yolo_model.predict(source=side_img, imgsz=640, verbose=False)
-        kp_f = front_res[0].keypoints.xy[0]
-        kp_s = side_res[0].keypoints.xy[0] if hasattr(side_res[0], "keypoints") and side_res[0].keypoints is not None else None
-        lm_f = {
-            'ls': kp_f[5].tolist(),
-            'rs': kp_f[6].tolist(),
-            'lh': kp_f[11].tolist(),
-            'rh': kp_f[12].tolist(),
-            'la': kp_f[15].tolist()
-        }
-        shoulder_px = distance(lm_f['ls'], lm_f['rs'])
-        chest_px = shoulder_px
-        waist_px = distance(lm_f['lh'], lm_f['rh'])
-        inseam_px = distance(lm_f['lh'], lm_f['la'])
-        height_px = distance(kp_f[0], kp_f[15])
-        scale = height / height_px if height_px > 0 else 1
-        chest_depth_px, waist_depth_px = 0, 0
-        if kp_s is not None:
-            chest_depth_px = distance(kp_s[5], kp_s[11]) * 0.6
-            waist_depth_px = distance(kp_s[11], kp_s[13]) * 0.5
-        shoulder_cm = shoulder_px * scale
-        chest_cm = elliptical_circumference(chest_px, chest_depth_px) * scale
-        waist_cm = elliptical_circumference(waist_px, waist_depth_px) * scale
-        inseam_cm = inseam_px * scale
-        return {
-            "shoulder_cm": round(shoulder_cm, 1),
-            "shoulder_in": cm_to_inch(shoulder_cm),
-            "chest_cm": round(chest_cm, 1),
-            "chest_in": cm_to_inch(chest_cm),
-            "waist_cm": round(waist_cm, 1),
-            "waist_in": cm_to_inch(waist_cm),
-            "inseam_cm": round(inseam_cm, 1),
-            "inseam_in": cm_to_inch(inseam_cm),
-            "gender": gender.lower() if gender else None,
-            "height_cm": height,
-            "weight_kg": weight if weight is not None else None
-        }
+        front_bytes = await front.read()
+        side_bytes = await side.read()
+        results = await pose_keypoints([front_bytes, side_bytes], ["yolo"])
+        front_pose, side_pose = results["yolo"]
+        if front_pose[1] is None:
+            return no_person_response()
+        return measure_pose("yolo", front_pose, side_pose, height, weight, gender)
+    except PoolBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
-async def detect_fullbody_service(image: UploadFile, background_tasks: BackgroundTasks = None):
-    def upload_task():
-        upload_image_to_cloudinary(image, folder="body_measurements")
+async def archive_image(image_bytes: bytes, folder: str):
+    # Best effort: the response never waits on (or fails because of) the archive upload
     try:
-        if background_tasks is not None:
-            background_tasks.add_task(upload_task)
-        img = parse_image(image)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        mp_holistic = mp.solutions.holistic
-        with mp_holistic.Holistic(static_image_mode=True, min_detection_confidence=0.5) as holistic:
-            results = holistic.process(img_rgb)
-            pose_landmarks = results.pose_landmarks
-            if pose_landmarks and len(pose_landmarks.landmark) >= 30:
-                required = [mp_holistic.PoseLandmark.LEFT_ANKLE, mp_holistic.PoseLandmark.RIGHT_ANKLE,
-                            mp_holistic.PoseLandmark.LEFT_SHOULDER, mp_holistic.PoseLandmark.RIGHT_SHOULDER,
-                            mp_holistic.PoseLandmark.NOSE]
-                visible = all(pose_landmarks.landmark[lm].visibility > 0.5 for lm in required)
-                if visible:
-                    return {"full_body": True, "message": "Full body detected"}
-                else:
-                    return {"full_body": False, "message": "Person detected, but not full body (some keypoints missing)"}
+        await upload_queue.submit(await upload_queue.spool(image_bytes), folder)
+    except (UploadQueueFullError, HTTPException, RuntimeError, OSError):
+        pass
+
+async def detect_fullbody_service(image: UploadFile):
+    try:
+        image_bytes = await image.read()
+        await archive_image(image_bytes, "body_measurements")
+        pose_landmarks = await pose_pool.run(holistic_pose_job, image_bytes)
+        if pose_landmarks is not None and len(pose_landmarks) >= 30:
+            required = [PoseLandmark.LEFT_ANKLE, PoseLandmark.RIGHT_ANKLE,
+                        PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER,
+                        PoseLandmark.NOSE]
+            visible = all(pose_landmarks[lm][3] > 0.5 for lm in required)
+            if visible:
+                return {"full_body": True, "message": "Full body detected"}
             else:
-                return {"full_body": False, "message": "No full body detected"}
+                return {"full_body": False, "message": "Person detected, but not full body (some keypoints missing)"}
+        else:
+            return {"full_body": False, "message": "No full body detected"}
+    except PoolBusyError as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 async def predict_avg_service(front: UploadFile, side: UploadFile, height: int, weight: int = None, gender: str = None):
     try:
-        import io
         front_bytes = await front.read()
         side_bytes = await side.read()
-        def make_uploadfile(filename, bytes_data):
-            file_obj = io.BytesIO(bytes_data)
-            upload_file = UploadFile(file=file_obj, filename=filename)
-            return upload_file
-        front1 = make_uploadfile(front.filename, front_bytes)
-        side1 = make_uploadfile(side.filename, side_bytes)
-        front2 = make_uploadfile(front.filename, front_bytes)
-        side2 = make_uploadfile(side.filename, side_bytes)
-        mediapipe_res = await predict_mediapipe_service(front=front1, side=side1, height=height, weight=weight, gender=gender)
-        yolo_res = await predict_yolo_service(front=front2, side=side2, height=height, weight=weight, gender=gender)
-        if isinstance(mediapipe_res, JSONResponse):
-            return mediapipe_res
-        if isinstance(yolo_res, JSONResponse):
-            return yolo_res
-        fields = [
-            "shoulder_cm", "shoulder_in", "chest_cm", "chest_in",
-            "waist_cm", "waist_in", "inseam_cm", "inseam_in"
-        ]
-        avg_result = {}
-        for f in fields:
-            v1 = mediapipe_res.get(f)
-            v2 = yolo_res.get(f)
-            if v1 is not None and v2 is not None:
-                avg_result[f] = round((v1 + v2) / 2, 1)
-            else:
-                avg_result[f] = v1 if v1 is not None else v2
-        avg_result["gender"] = mediapipe_res.get("gender") or yolo_res.get("gender")
-        avg_result["height_cm"] = mediapipe_res.get("height_cm") or yolo_res.get("height_cm")
-        avg_result["weight_kg"] = mediapipe_res.get("weight_kg") or yolo_res.get("weight_kg")
+        # Both backends read the same decoded images, and run at the same time
+        results = await pose_keypoints([front_bytes, side_bytes], ["mediapipe", "yolo"])
+        if results["mediapipe"][0][1] is None or results["yolo"][0][1] is None:
+            return no_person_response()
+        mediapipe_res = measure_pose("mediapipe", *results["mediapipe"], height, weight, gender)
+        yolo_res = measure_pose("yolo", *results["yolo"], height, weight, gender)
         return {
-            "average": avg_result,
+            "average": average_measurements(mediapipe_res, yolo_res),
             "mediapipe": mediapipe_res,
             "yolo": yolo_res
         }
+    except PoolBusyError as e:
+        return busy_response(e)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)}) 
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": str(e)})
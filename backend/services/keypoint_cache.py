@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+
+# Raw pose keypoints per (backend, image bytes), so resubmitting the same photos with another
+# height, weight or gender skips inference; measurements are always recomputed from keypoints
+KEYPOINT_CACHE_SIZE = int(os.getenv("KEYPOINT_CACHE_SIZE", "2048"))
+KEYPOINT_CACHE_TTL = float(os.getenv("KEYPOINT_CACHE_TTL", "86400"))
+# Also keep entries in the keypoint_cache table, shared by every API process and kept across restarts
+KEYPOINT_CACHE_PERSIST = os.getenv("KEYPOINT_CACHE_PERSIST", "0").lower() in ("1", "true", "yes")
+
+def image_key(data: bytes, backend: str):
+    return f"{backend}:{hashlib.sha256(data).hexdigest()}"
+
+def encode_value(value):
+    shape, keypoints = value
+    return json.dumps({"shape": list(shape), "keypoints": keypoints.tolist() if keypoints is not None else None})
+
+def decode_value(data: str):
+    value = json.loads(data)
+    keypoints = np.array(value["keypoints"], dtype=np.float32) if value["keypoints"] is not None else None
+    return tuple(value["shape"]), keypoints
+
+class PostgresKeypointStore:
+    """Blocking store on the keypoint_cache table; KeypointCache calls it from a thread."""
+    def __init__(self, ttl: float = KEYPOINT_CACHE_TTL):
+        self.ttl = ttl
+
+    def get(self, key: str):
+        from database import SessionLocal, KeypointCacheEntry
+        with SessionLocal() as db:
+            entry = db.get(KeypointCacheEntry, key)
+            if entry is None or entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                return None
+            return decode_value(entry.value)
+
+    def put(self, key: str, value):
+        from database import SessionLocal, KeypointCacheEntry
+        with SessionLocal() as db:
+            db.merge(KeypointCacheEntry(key=key, value=encode_value(value), created_at=datetime.utcnow()))
+            db.commit()
+
+class KeypointCache:
+    """In-memory LRU with TTL, optionally backed by a persistent store."""
+    def __init__(self, max_size: int = KEYPOINT_CACHE_SIZE, ttl: float = KEYPOINT_CACHE_TTL, store=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.store_errors = 0
+        self._entries = OrderedDict()
+
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        value = self._get_local(key)
+        if value is None and self.store is not None:
+            try:
+                value = await asyncio.to_thread(self.store.get, key)
+            except Exception:
+                # The cache is an optimization; a store outage only costs the inference
+                self.store_errors += 1
+            if value is not None:
+                self._put_local(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def get_many(self, keys: list):
+        return [await self.get(key) for key in keys]
+
+    async def put(self, key: str, value):
+        self._put_local(key, value)
+        if self.store is not None:
+            try:
+                await asyncio.to_thread(self.store.put, key, value)
+            except Exception:
+                self.store_errors += 1
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent": self.store is not None,
+            "store_errors": self.store_errors
+        }
+
+keypoint_cache = KeypointCache(store=PostgresKeypointStore() if KEYPOINT_CACHE_PERSIST else None)
@@ -0,0 +1,78 @@
+import asyncio
+import os
+from services.pose_pool import pose_pool, yolo_pose_batch_job
+
+# Images per YOLO predict call, and how long the first pending image waits for others
+YOLO_MAX_BATCH = int(os.getenv("YOLO_MAX_BATCH", "16"))
+YOLO_BATCH_WAIT_MS = float(os.getenv("YOLO_BATCH_WAIT_MS", "10"))
+
+class YoloPoseBatcher:
+    """Collects images from concurrent requests into one YOLO predict call.
+
+    A batch is flushed once YOLO_MAX_BATCH images are pending or the oldest one has waited
+    YOLO_BATCH_WAIT_MS, then keypoints are routed back to each request in order.
+    """
+    def __init__(self, pool=pose_pool, max_batch: int = YOLO_MAX_BATCH, max_wait_ms: float = YOLO_BATCH_WAIT_MS):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.n_batches = 0
+        self.n_images = 0
+        self._pending = []
+        self._pending_images = 0
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def predict(self, *images):
+        """Keypoints (or None) for each image (raw bytes or SharedImage), in order."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((images, future))
+        self._pending_images += len(images)
+        if self._pending_images >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending, self._pending_images = self._pending, [], 0
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        sources = [source for images, _ in batch for source in images]
+        try:
+            outputs = await self.pool.run(yolo_pose_batch_job, sources)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.n_batches += 1
+        self.n_images += len(sources)
+        start = 0
+        for images, future in batch:
+            keypoints = outputs[start:start + len(images)]
+            start += len(images)
+            if future.done():
+                continue
+            error = next((k for k in keypoints if isinstance(k, Exception)), None)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(keypoints)
+
+    def stats(self):
+        return {
+            "batches": self.n_batches,
+            "mean_batch_size": self.n_images / self.n_batches if self.n_batches else 0.0,
+            "pending_images": self._pending_images
+        }
+
+yolo_batcher = YoloPoseBatcher()
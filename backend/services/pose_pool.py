@@ -0,0 +1,280 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from multiprocessing import shared_memory
+from typing import Optional
+import numpy as np
+import cv2
+from utils.body_measure_utils import decode_image
+
+# Pose inference runs in worker processes so YOLO/MediaPipe never block the event loop
+POSE_WORKERS = int(os.getenv("POSE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Requests allowed to wait for a free worker; beyond that callers wait up to POSE_QUEUE_TIMEOUT, then get a 503
+POSE_MAX_QUEUE = int(os.getenv("POSE_MAX_QUEUE", POSE_WORKERS * 4))
+POSE_QUEUE_TIMEOUT = float(os.getenv("POSE_QUEUE_TIMEOUT", "5"))
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS", "weights/yolov8m-pose.pt")
+# MediaPipe Pose/Holistic instances built per worker; a worker runs one job at a time, so 1 is enough
+# unless jobs are also run from threads
+MEDIAPIPE_DETECTORS_PER_WORKER = int(os.getenv("MEDIAPIPE_DETECTORS_PER_WORKER", "1"))
+# Load and warm up the models in every worker at app startup (in the background); with 0 each worker
+# loads a model the first time a request needs it. Unset, only body_measure_api (which serves nothing
+# but measurements) preloads, so processes that mostly serve users and products don't spawn the pool
+_pose_preload = os.getenv("POSE_PRELOAD")
+POSE_PRELOAD = None if _pose_preload is None else _pose_preload.lower() in ("1", "true", "yes")
+POSE_WARMUP_RUNS = int(os.getenv("POSE_WARMUP_RUNS", "1"))
+POSE_WARMUP_TIMEOUT = float(os.getenv("POSE_WARMUP_TIMEOUT", "300"))
+
+class PoolBusyError(Exception):
+    pass
+
+class DetectorPool:
+    """Pre-built MediaPipe graphs with checkout/return; a graph is never used by two threads at once."""
+    def __init__(self, factory, size: int = 1):
+        self._detectors = queue.Queue()
+        for _ in range(size):
+            self._detectors.put(factory())
+
+    @contextmanager
+    def checkout(self):
+        detector = self._detectors.get()
+        try:
+            yield detector
+        finally:
+            self._detectors.put(detector)
+
+def _load_yolo():
+    from ultralytics import YOLO
+    return YOLO(YOLO_WEIGHTS)
+
+def _load_pose():
+    import mediapipe as mp
+    return DetectorPool(lambda: mp.solutions.pose.Pose(static_image_mode=True), MEDIAPIPE_DETECTORS_PER_WORKER)
+
+def _load_holistic():
+    import mediapipe as mp
+    return DetectorPool(
+        lambda: mp.solutions.holistic.Holistic(static_image_mode=True, min_detection_confidence=0.5), MEDIAPIPE_DETECTORS_PER_WORKER
+    )
+
+# Per-process model registry; heavy imports happen in the workers only
+MODEL_LOADERS = {"yolo": _load_yolo, "pose": _load_pose, "holistic": _load_holistic}
+_models = {}
+
+def get_model(name: str):
+    if name not in _models:
+        _models[name] = MODEL_LOADERS[name]()
+    return _models[name]
+
+def _warmup(runs: int):
+    # First inferences pay for kernel selection and buffer allocation; do them before real traffic
+    image = np.zeros((640, 480, 3), dtype=np.uint8)
+    for _ in range(runs):
+        get_model("yolo").predict(source=image, imgsz=640, verbose=False)
+        for name in ("pose", "holistic"):
+            with get_model(name).checkout() as detector:
+                detector.process(image)
+
+def _init_worker(n_threads: int, preload: bool, warmup_runs: int):
+    import torch
+    # Split the cores between workers instead of every worker spawning a thread per core
+    torch.set_num_threads(n_threads)
+    cv2.setNumThreads(n_threads)
+    if preload:
+        for name in MODEL_LOADERS:
+            get_model(name)
+        _warmup(warmup_runs)
+
+def _worker_ready_job():
+    # Runs after _init_worker; the short sleep lets other workers pick up the remaining pings
+    time.sleep(0.05)
+    return os.getpid()
+
+class SharedImage:
+    """Decoded image in shared memory; pickles as just its name, shape and scale."""
+    def __init__(self, name: str, shape: tuple, scale: float):
+        self.name = name
+        self.shape = shape
+        self.scale = scale
+
+def share_image(data: bytes):
+    image, scale = decode_image(data)
+    shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+    np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf)[:] = image
+    return shm, SharedImage(shm.name, image.shape, scale)
+
+@asynccontextmanager
+async def shared_images(*images_bytes: bytes):
+    """Decodes each image once (off the event loop) for every backend that needs it."""
+    results = await asyncio.gather(*[asyncio.to_thread(share_image, data) for data in images_bytes], return_exceptions=True)
+    try:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        yield [ref for _, ref in results]
+    finally:
+        for result in results:
+            if not isinstance(result, BaseException):
+                result[0].close()
+                result[0].unlink()
+
+def load_image(source):
+    """BGR image and its scale (see decode_image) from raw bytes or a SharedImage."""
+    if isinstance(source, SharedImage):
+        shm = shared_memory.SharedMemory(name=source.name)
+        try:
+            return np.ndarray(source.shape, dtype=np.uint8, buffer=shm.buf).copy(), source.scale
+        finally:
+            shm.close()
+    return decode_image(source)
+
+def original_shape(image, scale: float):
+    H, W, C = image.shape
+    return round(H / scale), round(W / scale), C
+
+def landmarks_to_array(landmarks):
+    # (33, 4) array of x, y, z, visibility; MediaPipe protobufs don't pickle
+    if not landmarks:
+        return None
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in landmarks.landmark], dtype=np.float32)
+
+# Every pose backend returns (original_shape, keypoints) per image; keypoints are None without a person
+
+def mediapipe_pose_job(*sources):
+    # Landmarks stay normalized; the original shape maps them back to original pixels
+    outputs = []
+    with get_model("pose").checkout() as pose_detector:
+        for source in sources:
+            image, scale = load_image(source)
+            result = pose_detector.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            outputs.append((original_shape(image, scale), landmarks_to_array(result.pose_landmarks)))
+    return outputs
+
+def _yolo_keypoints(result, scale: float):
+    # Keypoints in original-resolution pixels
+    if getattr(result, "keypoints", None) is None or len(result.keypoints.xy) == 0:
+        return None
+    return result.keypoints.xy[0].cpu().numpy() / scale
+
+def yolo_pose_batch_job(sources: list):
+    # One predict call for the whole batch; an unreadable image fails only its own slot
+    outputs, images, scales, positions = [None] * len(sources), [], [], []
+    for i, source in enumerate(sources):
+        try:
+            image, scale = load_image(source)
+            images.append(image)
+            scales.append(scale)
+            positions.append(i)
+        except (ValueError, FileNotFoundError) as e:
+            outputs[i] = e
+    if images:
+        results = get_model("yolo").predict(source=images, imgsz=640, verbose=False)
+        for i, image, result, scale in zip(positions, images, results, scales):
+            outputs[i] = (original_shape(image, scale), _yolo_keypoints(result, scale))
+    return outputs
+
+def holistic_pose_job(image):
+    img_rgb = cv2.cvtColor(load_image(image)[0], cv2.COLOR_BGR2RGB)
+    with get_model("holistic").checkout() as holistic:
+        results = holistic.process(img_rgb)
+    return landmarks_to_array(results.pose_landmarks)
+
+class PosePool:
+    def __init__(self, max_workers: int = POSE_WORKERS, max_queue: int = POSE_MAX_QUEUE, queue_timeout: float = POSE_QUEUE_TIMEOUT,
+                 preload: Optional[bool] = POSE_PRELOAD, warmup_runs: int = POSE_WARMUP_RUNS):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.preload = preload
+        self.warmup_runs = warmup_runs
+        self.in_flight = 0
+        self.rejected = 0
+        # cold: loads on first request, loading: startup warm-up running, ready: every worker warm, failed: warm-up error
+        self.state = "cold"
+        self.error = None
+        self.workers_ready = 0
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self):
+        # Created on first use so importing the service doesn't spawn processes
+        if self._executor is None:
+            n_threads = max(1, (os.cpu_count() or 1) // self.max_workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(n_threads, self.preload, self.warmup_runs)
+            )
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        return self._executor
+
+    def resolve_preload(self, default: bool) -> bool:
+        """Settles `preload` left unset by POSE_PRELOAD to the app's default; call before the first job."""
+        if self.preload is None:
+            self.preload = default
+        return self.preload
+
+    async def start(self, timeout: float = POSE_WARMUP_TIMEOUT):
+        """Starts every worker and waits until each has loaded and warmed up its models."""
+        if self.state in ("loading", "ready"):
+            return
+        self.state = "loading"
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pids = set()
+        try:
+            while len(pids) < self.max_workers:
+                if loop.time() > deadline:
+                    raise TimeoutError(f"Only {len(pids)}/{self.max_workers} pose workers ready after {timeout}s")
+                pings = [loop.run_in_executor(executor, _worker_ready_job) for _ in range(self.max_workers)]
+                pids.update(await asyncio.gather(*pings))
+                self.workers_ready = len(pids)
+            self.state = "ready"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+
+    def readiness(self):
+        return {
+            "ready": self.state == "ready",
+            "state": self.state,
+            "preload": self.preload,
+            "workers_ready": self.workers_ready,
+            "workers": self.max_workers,
+            "error": self.error
+        }
+
+    async def run(self, fn, *args):
+        executor = self._get_executor()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolBusyError(f"Pose inference queue is full ({self.max_workers + self.max_queue} requests in flight)")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+pose_pool = PosePool()
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import random
+import shutil
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from models.pydantic_models import UploadStatus
+from utils.upload_utils import save_image_upload, save_image_bytes
+
+# Images are spooled to local disk, their DB rows written as pending, and a fixed set of workers
+# uploads them to remote storage in the background
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+# Uploads allowed to wait for a worker; beyond that submit() raises UploadQueueFullError
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "100"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "5"))
+# Retry n waits about UPLOAD_RETRY_BACKOFF * 2**n seconds (with jitter)
+UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "1"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "upload_spool"))
+# "cloudinary", or "local" to store files under UPLOAD_LOCAL_STORAGE_DIR (offline development and testing)
+UPLOAD_STORAGE = os.getenv("UPLOAD_STORAGE", "cloudinary")
+UPLOAD_LOCAL_STORAGE_DIR = os.getenv("UPLOAD_LOCAL_STORAGE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "remote_storage"))
+
+class UploadQueueFullError(Exception):
+    pass
+
+class CloudinaryStorage:
+    def __init__(self):
+        # Applies the account configuration and sizes the SDK's connection pool
+        from utils.cloudinary_utils import upload_file_to_cloudinary
+        self._upload = upload_file_to_cloudinary
+
+    def upload(self, path: str, folder: str = None):
+        return self._upload(path, folder)
+
+class LocalStorage:
+    """Stub backend that copies files into a local directory and returns file:// URLs."""
+    def __init__(self, root: str = UPLOAD_LOCAL_STORAGE_DIR):
+        self.root = root
+
+    def upload(self, path: str, folder: str = None):
+        target_dir = os.path.join(self.root, folder or "")
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(path))
+        shutil.copyfile(path, target)
+        return f"file://{os.path.abspath(target)}"
+
+STORAGE_BACKENDS = {"cloudinary": CloudinaryStorage, "local": LocalStorage}
+
+def set_user_image_status(user_image_id: int, status: UploadStatus, image_url: str = None):
+    from database import SessionLocal, UserImage
+    with SessionLocal() as db:
+        user_image = db.get(UserImage, user_image_id)
+        if user_image is None:
+            return
+        user_image.status = status
+        if image_url is not None:
+            user_image.image_url = image_url
+        db.commit()
+
+class UploadQueue:
+    """Bounded queue of spooled uploads.
+
+    Each job is a spooled image plus a `<job_id>.json` file, so jobs survive a restart and are
+    picked up again by start(). Identical images share one spool file.
+    """
+    def __init__(self, storage: str = UPLOAD_STORAGE, workers: int = UPLOAD_WORKERS, max_queue: int = UPLOAD_QUEUE_SIZE,
+                 max_attempts: int = UPLOAD_MAX_ATTEMPTS, retry_backoff: float = UPLOAD_RETRY_BACKOFF, spool_dir: str = UPLOAD_SPOOL_DIR):
+        self.storage_name = storage
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.spool_dir = spool_dir
+        self.uploaded = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self._storage = None
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+        self._spool_refs = Counter()
+
+    def _job_path(self, job_id: str):
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    async def start(self):
+        """Starts the workers and re-queues jobs spooled before the last shutdown."""
+        if self._tasks:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._storage = STORAGE_BACKENDS[self.storage_name]()
+        # Long-lived threads, so each keeps its pooled connection between uploads
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+        jobs = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.spool_dir, name)) as f:
+                    jobs.append(json.load(f))
+        self._queue = asyncio.Queue(maxsize=max(self.max_queue, len(jobs)))
+        for job in jobs:
+            self._spool_refs[job["filename"]] += 1
+            self._queue.put_nowait(job)
+        # Images spooled without a job file (crash in between) have nothing pointing at them
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(".json") and not name.startswith(".") and name not in self._spool_refs:
+                os.remove(os.path.join(self.spool_dir, name))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def check_capacity(self):
+        if self._queue is None:
+            raise RuntimeError("Upload queue is not started")
+        if self._queue.full():
+            self.rejected += 1
+            raise UploadQueueFullError(f"Upload queue is full ({self.max_queue} uploads waiting)")
+
+    async def spool(self, source):
+        """Validates and spools an UploadFile or image bytes; returns the spool filename.
+
+        The file is kept until it is passed to submit() or discard().
+        """
+        self.check_capacity()
+        if isinstance(source, bytes):
+            filename = await save_image_bytes(source, folder=self.spool_dir)
+        else:
+            filename = await save_image_upload(source, folder=self.spool_dir)
+        self._spool_refs[filename] += 1
+        return filename
+
+    def discard(self, filename: str):
+        self._spool_refs[filename] -= 1
+        if self._spool_refs[filename] <= 0:
+            del self._spool_refs[filename]
+            os.remove(os.path.join(self.spool_dir, filename))
+
+    async def submit(self, filename: str, folder: str = None, user_image_id: int = None):
+        """Queues a spooled image; `user_image_id` gets its status and URL updated when done."""
+        job = {"id": uuid.uuid4().hex, "filename": filename, "folder": folder, "user_image_id": user_image_id, "attempts": 0}
+        try:
+            self.check_capacity()
+            await asyncio.to_thread(self._write_job, job)
+        except BaseException:
+            self.discard(filename)
+            raise
+        self._queue.put_nowait(job)
+        return job["id"]
+
+    def _write_job(self, job: dict):
+        tmp_path = self._job_path(job["id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._job_path(job["id"]))
+
+    def _finish(self, job: dict):
+        os.remove(self._job_path(job["id"]))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(loop, job)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, loop, job: dict):
+        path = os.path.join(self.spool_dir, job["filename"])
+        while True:
+            try:
+                url = await loop.run_in_executor(self._executor, self._storage.upload, path, job["folder"])
+                status = UploadStatus.UPLOADED
+                self.uploaded += 1
+                break
+            except Exception:
+                job["attempts"] += 1
+                if job["attempts"] >= self.max_attempts:
+                    url, status = None, UploadStatus.FAILED
+                    self.failed += 1
+                    break
+                self.retries += 1
+                await asyncio.to_thread(self._write_job, job)
+                await asyncio.sleep(self.retry_backoff * 2 ** (job["attempts"] - 1) * random.uniform(0.5, 1.5))
+        if job["user_image_id"] is not None:
+            try:
+                await asyncio.to_thread(set_user_image_status, job["user_image_id"], status, url)
+            except Exception:
+                # Keep the job spooled; it is retried after the next restart
+                return
+        await asyncio.to_thread(self._finish, job)
+        self.discard(job["filename"])
+
+    def stats(self):
+        return {
+            "storage": self.storage_name,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rejected": self.rejected
+        }
+
+    async def shutdown(self):
+        # Queued jobs stay spooled and are resumed on the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+upload_queue = UploadQueue()
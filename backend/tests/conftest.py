@@ -0,0 +1,13 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database and local upload storage before any backend
+# module reads its configuration
+workdir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/app.db"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/app.db"
+os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+os.environ["UPLOAD_SPOOL_DIR"] = os.path.join(workdir, "spool")
+os.environ["UPLOAD_STORAGE"] = "local"
+os.environ["UPLOAD_LOCAL_STORAGE_DIR"] = os.path.join(workdir, "remote")
+os.environ.setdefault("POSE_PRELOAD", "0")
@@ -0,0 +1,80 @@
+"""
+How many SQL statements each users/products endpoint runs, against the throwaway SQLite
+database set up in conftest.py. A test fails when an endpoint runs more than its budget
+(e.g. an N+1 crept in).
+"""
+import io
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import event
+from database import Base, engine, async_engine
+from api.users import router as users_router
+from api.products import router as products_router
+from services.upload_queue import upload_queue
+from utils.query_counter import count_queries
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    # SQLite skips foreign key checks unless asked; PostgreSQL always enforces them
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.fixture(scope="module")
+def client():
+    for e in (engine, async_engine.sync_engine):
+        event.listen(e, "connect", enable_foreign_keys)
+    Base.metadata.create_all(engine)
+
+    app = FastAPI()
+    app.include_router(users_router, prefix="/users")
+    app.include_router(products_router, prefix="/products")
+
+    @app.on_event("startup")
+    async def startup():
+        await upload_queue.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await upload_queue.shutdown()
+
+    with TestClient(app) as client:
+        yield client
+    Base.metadata.drop_all(engine)
+    for e in (engine, async_engine.sync_engine):
+        event.remove(e, "connect", enable_foreign_keys)
+
+# (label, method, path, request kwargs, expected status, max statements)
+# Checks run in order; later ones use the rows created by earlier ones
+CHECKS = [
+    ("create user", "post", "/users/", {"json": {"username": "alice", "email": "alice@example.com"}}, 200, 1),
+    ("create user 2", "post", "/users/", {"json": {"username": "bob", "email": "bob@example.com"}}, 200, 1),
+    ("list users", "get", "/users/", {}, 200, 1),
+    ("list users (projected)", "get", "/users/", {"params": {"fields": "id,username", "limit": 1}}, 200, 1),
+    ("upload user image", "post", "/users/1/upload_image", {"files": {"image": ("a.png", png_bytes("red"))}}, 200, 1),
+    ("upload user image (missing user)", "post", "/users/99/upload_image", {"files": {"image": ("a.png", png_bytes("red"))}}, 404, 1),
+    ("upload body image", "post", "/users/1/upload_body_image", {"params": {"image_type": "front"}, "files": {"image": ("f.png", png_bytes("blue"))}}, 200, 1),
+    ("upload body image 2", "post", "/users/1/upload_body_image", {"params": {"image_type": "side"}, "files": {"image": ("s.png", png_bytes("green"))}}, 200, 1),
+    ("upload body image (missing user)", "post", "/users/99/upload_body_image", {"params": {"image_type": "front"}, "files": {"image": ("f.png", png_bytes("blue"))}}, 404, 1),
+    ("user images", "get", "/users/1/images", {}, 200, 1),
+    ("user images by type", "get", "/users/1/images", {"params": {"image_type": "side"}}, 200, 1),
+    ("user images (no images)", "get", "/users/2/images", {}, 200, 1),
+    ("user images (missing user)", "get", "/users/99/images", {}, 404, 1),
+    ("create product", "post", "/products/", {"json": {"name": "shirt", "price": 9.5}}, 200, 1),
+    ("list products", "get", "/products/", {"params": {"sort": "name"}}, 200, 1),
+    ("upload product image", "post", "/products/1/upload_image", {"files": {"image": ("p.png", png_bytes("white"))}}, 200, 1),
+]
+
+@pytest.mark.parametrize("label, method, path, kwargs, expected_status, budget", CHECKS, ids=[check[0] for check in CHECKS])
+def test_query_count(client, label, method, path, kwargs, expected_status, budget):
+    with count_queries(async_engine.sync_engine) as counter:
+        response = getattr(client, method)(path, **kwargs)
+    assert response.status_code == expected_status, response.text
+    statements = "\n".join(" ".join(statement.split()) for statement in counter.statements)
+    assert counter.count <= budget, f"{label}: {counter.count} statement(s) (budget {budget})\n{statements}"
@@ -1,10 +1,48 @@
+import io
+import os
 import numpy as np
 import cv2
+from PIL import Image
 from fastapi import UploadFile
 
-def parse_image(file: UploadFile):
+# Uploads are decoded with their long edge at most this many pixels (0 keeps full resolution).
+# YOLO resizes to 640 and MediaPipe to 256 internally, so full 12MP decodes are wasted work.
+POSE_MAX_LONG_EDGE = int(os.getenv("POSE_MAX_LONG_EDGE", "1280"))
+
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def image_long_edge(data: bytes):
+    # Reads the header only; None if PIL can't identify the format
+    try:
+        return max(Image.open(io.BytesIO(data)).size)
+    except Exception:
+        return None
+
+def decode_image(data: bytes, max_long_edge: int = POSE_MAX_LONG_EDGE):
+    """Decodes an upload with EXIF orientation applied and its long edge at most `max_long_edge`.
+
+    Returns the image and its scale relative to the original resolution (decoded px / original px).
+    JPEGs are decoded directly at 1/2, 1/4 or 1/8 resolution when that still covers `max_long_edge`.
+    """
+    long_edge = image_long_edge(data)
+    flag = cv2.IMREAD_COLOR
+    if max_long_edge and long_edge:
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+            if long_edge / factor >= max_long_edge:
+                flag = reduced_flag
+                break
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        raise ValueError("Could not decode image")
+    if max_long_edge and max(image.shape[:2]) > max_long_edge:
+        factor = max_long_edge / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    scale = max(image.shape[:2]) / long_edge if long_edge else 1.0
+    return image, scale
+
+def parse_image(file: UploadFile, max_long_edge: int = POSE_MAX_LONG_EDGE):
     data = file.file.read()
-    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    image, _ = decode_image(data, max_long_edge)
     file.file.close()
     return image
 
@@ -12,7 +50,8 @@ def cm_to_inch(cm):
     return round(cm / 2.54, 1)
 
 def distance(p1, p2):
-    return np.linalg.norm(np.array(p1) - np.array(p2))
+    # Works on single points and on arrays of points (distance along the last axis)
+    return np.linalg.norm(np.asarray(p1, dtype=np.float64) - np.asarray(p2, dtype=np.float64), axis=-1)
 
 def elliptical_circumference(width, depth):
     a, b = width / 2, depth / 2
@@ -0,0 +1,138 @@
+from enum import IntEnum
+import numpy as np
+from utils.body_measure_utils import cm_to_inch, distance, elliptical_circumference
+
+class PoseLandmark(IntEnum):
+    # Same indices as mediapipe's PoseLandmark; mediapipe itself is only imported by the pose workers
+    NOSE = 0
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+
+class CocoKeypoint(IntEnum):
+    # YOLO pose keypoints
+    NOSE = 0
+    LEFT_SHOULDER = 5
+    RIGHT_SHOULDER = 6
+    LEFT_HIP = 11
+    RIGHT_HIP = 12
+    LEFT_KNEE = 13
+    LEFT_ANKLE = 15
+
+# Keypoint index of every body point the measurements use, per pose backend. A new backend only
+# needs an entry here and keypoints in original-resolution pixels.
+BACKEND_KEYPOINTS = {
+    "mediapipe": {
+        "top": PoseLandmark.NOSE,
+        "bottom": PoseLandmark.LEFT_HEEL,
+        "left_shoulder": PoseLandmark.LEFT_SHOULDER,
+        "right_shoulder": PoseLandmark.RIGHT_SHOULDER,
+        "left_hip": PoseLandmark.LEFT_HIP,
+        "right_hip": PoseLandmark.RIGHT_HIP,
+        "left_knee": PoseLandmark.LEFT_KNEE,
+        "left_ankle": PoseLandmark.LEFT_ANKLE
+    },
+    "yolo": {
+        "top": CocoKeypoint.NOSE,
+        "bottom": CocoKeypoint.LEFT_ANKLE,
+        "left_shoulder": CocoKeypoint.LEFT_SHOULDER,
+        "right_shoulder": CocoKeypoint.RIGHT_SHOULDER,
+        "left_hip": CocoKeypoint.LEFT_HIP,
+        "right_hip": CocoKeypoint.RIGHT_HIP,
+        "left_knee": CocoKeypoint.LEFT_KNEE,
+        "left_ankle": CocoKeypoint.LEFT_ANKLE
+    }
+}
+
+# Body depth seen from the side, as a fraction of a side-view segment length
+CHEST_DEPTH_RATIO = 0.6
+WAIST_DEPTH_RATIO = 0.5
+
+def keypoints_to_pixels(backend: str, keypoints, shape):
+    """(K, 2) original-resolution pixels; MediaPipe landmarks are normalized to the image `shape`."""
+    if backend == "mediapipe":
+        H, W = shape[:2]
+        return keypoints[:, :2] * (W, H)
+    return keypoints[:, :2]
+
+def stack_keypoints(keypoints: list, n_keypoints: int):
+    """(N, K, 2) array from per-subject keypoints; subjects without keypoints (None) are NaN."""
+    stacked = np.full((len(keypoints), n_keypoints, 2), np.nan)
+    for i, kp in enumerate(keypoints):
+        if kp is not None:
+            stacked[i, :len(kp)] = kp[:n_keypoints, :2]
+    return stacked
+
+def compute_measurements(backend: str, front, side, heights):
+    """Measurements in cm for a batch of subjects.
+
+    `front` and `side` are (N, K, 2) pixel keypoints (side rows may be NaN when there is no side
+    photo) and `heights` the subjects' heights in cm. Returns (N,) arrays keyed by measurement.
+    """
+    idx = BACKEND_KEYPOINTS[backend]
+    front = np.asarray(front, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    shoulder_px = distance(front[:, idx["left_shoulder"]], front[:, idx["right_shoulder"]])
+    chest_px = shoulder_px
+    waist_px = distance(front[:, idx["left_hip"]], front[:, idx["right_hip"]])
+    inseam_px = distance(front[:, idx["left_hip"]], front[:, idx["left_ankle"]])
+    height_px = distance(front[:, idx["top"]], front[:, idx["bottom"]])
+    scale = np.divide(heights, height_px, out=np.ones_like(heights), where=height_px > 0)
+    if side is None:
+        chest_depth_px = waist_depth_px = np.zeros_like(heights)
+    else:
+        side = np.asarray(side, dtype=np.float64)
+        chest_depth_px = np.nan_to_num(distance(side[:, idx["left_shoulder"]], side[:, idx["left_hip"]]) * CHEST_DEPTH_RATIO)
+        waist_depth_px = np.nan_to_num(distance(side[:, idx["left_hip"]], side[:, idx["left_knee"]]) * WAIST_DEPTH_RATIO)
+    return {
+        "shoulder_cm": shoulder_px * scale,
+        "chest_cm": elliptical_circumference(chest_px, chest_depth_px) * scale,
+        "waist_cm": elliptical_circumference(waist_px, waist_depth_px) * scale,
+        "inseam_cm": inseam_px * scale
+    }
+
+def measurement_result(shoulder_cm, chest_cm, waist_cm, inseam_cm, height: int, weight: int = None, gender: str = None):
+    return {
+        "shoulder_cm": round(float(shoulder_cm), 1),
+        "shoulder_in": cm_to_inch(float(shoulder_cm)),
+        "chest_cm": round(float(chest_cm), 1),
+        "chest_in": cm_to_inch(float(chest_cm)),
+        "waist_cm": round(float(waist_cm), 1),
+        "waist_in": cm_to_inch(float(waist_cm)),
+        "inseam_cm": round(float(inseam_cm), 1),
+        "inseam_in": cm_to_inch(float(inseam_cm)),
+        "gender": gender.lower() if gender else None,
+        "height_cm": height,
+        "weight_kg": weight if weight is not None else None
+    }
+
+def measurement_results(measurements: dict, heights: list, weights: list = None, genders: list = None):
+    """Response dicts for the output of compute_measurements."""
+    n = len(heights)
+    weights = weights if weights is not None else [None] * n
+    genders = genders if genders is not None else [None] * n
+    return [
+        measurement_result(
+            measurements["shoulder_cm"][i], measurements["chest_cm"][i], measurements["waist_cm"][i],
+            measurements["inseam_cm"][i], heights[i], weights[i], genders[i]
+        )
+        for i in range(n)
+    ]
+
+def measure_pose(backend: str, front, side, height: int, weight: int = None, gender: str = None):
+    """Measurements for one subject from (original_shape, keypoints) pose results. Like the
+    services always did, MediaPipe side landmarks are mapped with the front image's size."""
+    front_shape, kp_f = front
+    kp_s = side[1] if side is not None else None
+    front_px = keypoints_to_pixels(backend, kp_f, front_shape)
+    side_px = keypoints_to_pixels(backend, kp_s, front_shape) if kp_s is not None else None
+    n_keypoints = len(front_px)
+    measurements = compute_measurements(
+        backend, front_px[None], stack_keypoints([side_px], n_keypoints), [height]
+    )
+    return measurement_results(measurements, [height], [weight], [gender])[0]
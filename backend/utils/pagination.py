@@ -0,0 +1,66 @@
+import base64
+import binascii
+import os
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+# Rows serialized per streamed chunk
+PAGE_CHUNK_ROWS = 100
+
+def encode_cursor(values: list):
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, orjson.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def parse_fields(fields: str, allowed: list):
+    """Requested columns from a comma-separated `fields` parameter; all of `allowed` when empty."""
+    if not fields:
+        return list(allowed)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+async def keyset_page(db: AsyncSession, model, fields: list, sort: str = "id", limit: int = PAGE_DEFAULT_LIMIT, cursor: str = None):
+    """One page of `model` rows ordered by (`sort`, id), starting after `cursor`.
+
+    Only the requested columns are loaded. Returns the rows as dicts and the cursor of the next
+    page (None on the last page). Paging never uses OFFSET, so every page costs the same index scan.
+    """
+    keys = [getattr(model, "id")] if sort == "id" else [getattr(model, sort), getattr(model, "id")]
+    columns = list(dict.fromkeys([*fields, *(key.key for key in keys)]))
+    query = select(*[getattr(model, column) for column in columns])
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(*keys) > tuple_(*values) if len(keys) > 1 else keys[0] > values[0])
+    rows = (await db.execute(query.order_by(*keys).limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+    return [{field: getattr(row, field) for field in fields} for row in rows], next_cursor
+
+def page_response(items: list, next_cursor: str = None):
+    """Streams `{"items": [...], "next_cursor": ...}`, serializing a chunk of rows at a time."""
+    def chunks():
+        yield b'{"items":['
+        for start in range(0, len(items), PAGE_CHUNK_ROWS):
+            chunk = b",".join(orjson.dumps(item) for item in items[start:start + PAGE_CHUNK_ROWS])
+            yield chunk if start == 0 else b"," + chunk
+        yield b'],"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+    return StreamingResponse(chunks(), media_type="application/json")
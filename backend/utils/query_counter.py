@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+class QueryCounter:
+    """SQL statements executed on an engine while counting."""
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine):
+    """Counts statements on `engine` (for an AsyncEngine pass `async_engine.sync_engine`)."""
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._record)
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from functools import lru_cache
+from fastapi import UploadFile, HTTPException
+from PIL import Image, ImageOps
+
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads'))
+# Largest accepted upload; bigger files are rejected with 413 while streaming
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Magic bytes of the accepted image types; the client's filename and content type are not trusted
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif")
+)
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+# Files stored by save_image_upload are named after their content and never change
+HASHED_FILENAME = re.compile(r"^([0-9a-f]{64})\.(jpg|png|gif)$")
+# Resized variants are cached on disk here (not served directly)
+VARIANTS_FOLDER = os.path.join(UPLOAD_FOLDER, ".variants")
+# Widths served for ?w=; other requested widths are rounded up to the next one
+VARIANT_WIDTHS = tuple(int(w) for w in os.getenv("UPLOAD_VARIANT_WIDTHS", "64,128,256,512,1024").split(","))
+
+def sniff_image_type(header: bytes):
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+def too_large():
+    return HTTPException(status_code=413, detail=f"File too large (max {UPLOAD_MAX_BYTES} bytes)")
+
+async def check_image_upload(upload: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES):
+    """Validates type and size without consuming the upload; returns the sniffed extension."""
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large()
+    extension = sniff_image_type(await upload.read(SNIFF_BYTES))
+    await upload.seek(0)
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    return extension
+
+def _write_new(filepath: str, data: bytes):
+    tmp_path = os.path.join(os.path.dirname(filepath), f".upload-{uuid.uuid4().hex}")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, filepath)
+
+async def save_image_bytes(data: bytes, folder: str = UPLOAD_FOLDER, max_bytes: int = UPLOAD_MAX_BYTES):
+    """Like save_image_upload, for an image already in memory."""
+    if len(data) > max_bytes:
+        raise too_large()
+    extension = sniff_image_type(data[:SNIFF_BYTES])
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    filename = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+    filepath = os.path.join(folder, filename)
+    if not os.path.exists(filepath):
+        await asyncio.to_thread(_write_new, filepath, data)
+    return filename
+
+async def save_image_upload(upload: UploadFile, folder: str = UPLOAD_FOLDER, max_bytes: int = UPLOAD_MAX_BYTES):
+    """Streams an image upload to `folder` and returns its filename.
+
+    Chunks are written off the event loop while the SHA-256 of the content is computed, and the
+    file is stored as `<sha256>.<ext>`, so identical images are stored once.
+    """
+    extension = await check_image_upload(upload, max_bytes)
+    tmp_path = os.path.join(folder, f".upload-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        try:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large()
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        filename = f"{digest.hexdigest()}.{extension}"
+        filepath = os.path.join(folder, filename)
+        if os.path.exists(filepath):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename
+
+@lru_cache(maxsize=4096)
+def _content_hash(path: str, mtime_ns: int, size: int):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_hash(filename: str, path: str, stat_result: os.stat_result):
+    """SHA-256 of a stored file; read from the name for hashed files, computed once otherwise."""
+    match = HASHED_FILENAME.match(filename)
+    if match:
+        return match.group(1)
+    return _content_hash(path, stat_result.st_mtime_ns, stat_result.st_size)
+
+def variant_width(width: int):
+    return next((w for w in VARIANT_WIDTHS if w >= width), VARIANT_WIDTHS[-1])
+
+def make_variant(path: str, variant_path: str, width: int):
+    """Writes `path` resized to at most `width` pixels wide (never enlarged) to `variant_path`."""
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        fmt = "JPEG" if variant_path.endswith(".jpg") else "PNG"
+        if fmt == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        tmp_path = os.path.join(os.path.dirname(variant_path), f".variant-{uuid.uuid4().hex}")
+        image.save(tmp_path, format=fmt, quality=85, optimize=True)
+    os.replace(tmp_path, variant_path)
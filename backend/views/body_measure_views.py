@@ -1,4 +1,4 @@
-from fastapi import APIRouter, File, UploadFile, Form, BackgroundTasks
+from fastapi import APIRouter, File, UploadFile, Form
 from fastapi.responses import JSONResponse
 from ..services.body_measure_service import (
     predict_mediapipe_service,
@@ -31,10 +31,9 @@ async def predict_yolo(
 
 @router.post("/detect-fullbody")
 async def detect_fullbody(
-    image: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    image: UploadFile = File(...)
 ):
-    return await detect_fullbody_service(image, background_tasks)
+    return await detect_fullbody_service(image)
 
 @router.post("/predict-avg")
 async def predict_avg(
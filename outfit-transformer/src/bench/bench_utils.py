@@ -0,0 +1,68 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ..data.datatypes import FashionItem
+
+
+def synchronize(device: Optional[str] = None):
+    if device is not None and str(device).startswith('cuda'):
+        torch.cuda.synchronize(device)
+
+
+def measure(
+    fn: Callable[[], Any],
+    n_warmup: int = 3,
+    n_iters: int = 20,
+    device: Optional[str] = None,
+) -> Dict[str, float]:
+    """Runs `fn` `n_warmup + n_iters` times and returns wall-clock statistics in milliseconds."""
+    for _ in range(n_warmup):
+        fn()
+    synchronize(device)
+
+    times = []
+    for _ in range(n_iters):
+        t = time.perf_counter()
+        fn()
+        synchronize(device)
+        times.append((time.perf_counter() - t) * 1000)
+
+    return {
+        'mean_ms': float(np.mean(times)),
+        'p50_ms': float(np.percentile(times, 50)),
+        'p99_ms': float(np.percentile(times, 99)),
+        'n_iters': n_iters,
+    }
+
+
+def make_items(
+    n_items: int,
+    d_embed: Optional[int] = None,
+    image_size: Optional[int] = None,
+    seed: int = 42,
+) -> List[FashionItem]:
+    """Synthetic catalog items with random precomputed embeddings and/or random images."""
+    rng = np.random.default_rng(seed)
+    items = []
+    for item_id in range(n_items):
+        items.append(FashionItem(
+            item_id=item_id,
+            category='tops',
+            description=f'synthetic item {item_id}',
+            image=Image.fromarray(
+                rng.integers(0, 256, (image_size, image_size, 3), dtype=np.uint8)
+            ) if image_size else None,
+            embedding=rng.standard_normal(d_embed).astype(np.float32) if d_embed else None,
+        ))
+
+    return items
+
+
+def make_embeddings(n: int, d_embed: int, seed: int = 42) -> np.ndarray:
+    embeddings = np.random.default_rng(seed).standard_normal((n, d_embed)).astype(np.float32)
+
+    return embeddings / np.linalg.norm(embeddings, axis=-1, keepdims=True)
@@ -0,0 +1,250 @@
+import json
+import os
+import pathlib
+import pickle
+import platform
+import subprocess
+import tempfile
+from argparse import ArgumentParser
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+import torch
+
+from . import bench_utils
+from .tiny_model import load_tiny_model
+from ..data import datatypes
+from ..demo.vectorstore import FAISSVectorStore
+from ..demo.vectorstore_utils import POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR, load_rec_embedding_dict
+from ..utils import profiler
+
+SRC_DIR = pathlib.Path(__file__).parent.parent.parent.absolute()
+RESULT_DIR = SRC_DIR / 'results'
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--benchmarks', type=str, nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('--device', type=str,
+                        default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--batch_sizes', type=int, nargs='+',
+                        default=[1, 8, 32, 128])
+    parser.add_argument('--outfit_lengths', type=int, nargs='+',
+                        default=[2, 4, 8, 16])
+    parser.add_argument('--n_catalog_items', type=int,
+                        default=4096)
+    parser.add_argument('--n_index_items', type=int,
+                        default=100000)
+    parser.add_argument('--n_queries', type=int,
+                        default=1024)
+    parser.add_argument('--n_shards', type=int,
+                        default=4)
+    parser.add_argument('--k', type=int,
+                        default=10)
+    parser.add_argument('--n_warmup', type=int,
+                        default=3)
+    parser.add_argument('--n_iters', type=int,
+                        default=20)
+    parser.add_argument('--seed', type=int,
+                        default=42)
+    parser.add_argument('--output', type=str,
+                        default=str(RESULT_DIR / 'bench' / 'bench.json'))
+    parser.add_argument('--profile_dir', type=str,
+                        default=None)
+
+    return parser.parse_args()
+
+
+def result(name: str, params: Dict[str, Any], stats: Dict[str, float], n_per_call: int, unit: str):
+    return {
+        'name': name,
+        'params': params,
+        **stats,
+        'throughput': n_per_call / stats['mean_ms'] * 1000,
+        'throughput_unit': unit,
+    }
+
+
+@torch.no_grad()
+def bench_clip_item_encoding(args, model) -> List[Dict[str, Any]]:
+    results = []
+    for batch_size in args.batch_sizes:
+        items = bench_utils.make_items(batch_size, image_size=256, seed=args.seed)
+        stats = bench_utils.measure(
+            lambda: model.precompute_clip_embedding(items),
+            n_warmup=args.n_warmup, n_iters=args.n_iters, device=args.device
+        )
+        results.append(result('clip_item_encoding', {'batch_size': batch_size}, stats, batch_size, 'items/s'))
+
+    return results
+
+
+def _bench_outfit_queries(args, model, name, query_cls, fn) -> List[Dict[str, Any]]:
+    results = []
+    items = bench_utils.make_items(max(args.outfit_lengths), d_embed=model.item_enc.d_embed, seed=args.seed)
+    for batch_size in args.batch_sizes:
+        for outfit_length in args.outfit_lengths:
+            query = [query_cls(outfit=items[:outfit_length]) for _ in range(batch_size)]
+            stats = bench_utils.measure(
+                lambda: fn(query, use_precomputed_embedding=True),
+                n_warmup=args.n_warmup, n_iters=args.n_iters, device=args.device
+            )
+            results.append(result(
+                name, {'batch_size': batch_size, 'outfit_length': outfit_length}, stats, batch_size, 'queries/s'
+            ))
+
+    return results
+
+
+@torch.no_grad()
+def bench_predict_score(args, model) -> List[Dict[str, Any]]:
+    return _bench_outfit_queries(args, model, 'predict_score', datatypes.FashionCompatibilityQuery, model.predict_score)
+
+
+@torch.no_grad()
+def bench_embed_query(args, model) -> List[Dict[str, Any]]:
+    return _bench_outfit_queries(args, model, 'embed_query', datatypes.FashionComplementaryQuery, model.embed_query)
+
+
+@torch.no_grad()
+def bench_embed_item(args, model) -> List[Dict[str, Any]]:
+    results = []
+    items = bench_utils.make_items(args.n_catalog_items, d_embed=model.item_enc.d_embed, seed=args.seed)
+    for batch_size in args.batch_sizes:
+        def embed_catalog():
+            for start in range(0, len(items), batch_size):
+                model.embed_item(items[start:start + batch_size], use_precomputed_embedding=True)
+
+        stats = bench_utils.measure(
+            embed_catalog, n_warmup=1, n_iters=max(1, args.n_iters // 10), device=args.device
+        )
+        results.append(result(
+            'embed_item', {'batch_size': batch_size, 'n_items': len(items)}, stats, len(items), 'items/s'
+        ))
+
+    return results
+
+
+def bench_faiss(args, model) -> List[Dict[str, Any]]:
+    d_embed = model.cfg.d_embed
+    embeddings = bench_utils.make_embeddings(args.n_index_items, d_embed, seed=args.seed)
+    ids = list(range(args.n_index_items))
+    queries = bench_utils.make_embeddings(args.n_queries, d_embed, seed=args.seed + 1)
+
+    results = []
+    for faiss_type in ['IndexFlatIP', 'IndexFlatL2']:
+        with tempfile.TemporaryDirectory() as base_dir:
+            indexer = FAISSVectorStore(
+                index_name='bench_index', faiss_type=faiss_type, base_dir=base_dir, d_embed=d_embed
+            )
+
+            def add():
+                indexer.index.reset()
+                indexer.add(embeddings=embeddings, ids=ids)
+
+            params = {'faiss_type': faiss_type, 'n_items': args.n_index_items}
+            stats = bench_utils.measure(add, n_warmup=1, n_iters=max(1, args.n_iters // 10))
+            results.append(result('faiss_add', params, stats, args.n_index_items, 'items/s'))
+
+            stats = bench_utils.measure(
+                lambda: indexer.search(embeddings=queries, k=args.k),
+                n_warmup=args.n_warmup, n_iters=args.n_iters
+            )
+            results.append(result('faiss_search', {**params, 'n_queries': args.n_queries, 'k': args.k}, stats, args.n_queries, 'queries/s'))
+
+            for outfit_length in args.outfit_lengths:
+                n_queries = max(1, args.n_queries // 16) # multi_vector_search loops over queries in Python
+                mv_queries = bench_utils.make_embeddings(
+                    n_queries * outfit_length, d_embed, seed=args.seed + 2
+                ).reshape(n_queries, outfit_length, d_embed)
+                stats = bench_utils.measure(
+                    lambda: indexer.multi_vector_search(embeddings=mv_queries, k=args.k),
+                    n_warmup=1, n_iters=max(1, args.n_iters // 4)
+                )
+                results.append(result(
+                    'faiss_multi_vector_search', {**params, 'n_queries': len(mv_queries), 'outfit_length': outfit_length, 'k': args.k},
+                    stats, len(mv_queries), 'queries/s'
+                ))
+
+    return results
+
+
+def bench_load_rec_embedding_dict(args, model) -> List[Dict[str, Any]]:
+    d_embed = model.cfg.d_embed
+    with tempfile.TemporaryDirectory() as polyvore_dir:
+        e_dir = POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR.format(polyvore_dir=polyvore_dir)
+        os.makedirs(e_dir, exist_ok=True)
+        shards = np.array_split(np.arange(args.n_index_items), args.n_shards)
+        for rank, shard_ids in enumerate(shards):
+            with open(os.path.join(e_dir, f'polyvore_{rank}.pkl'), 'wb') as f:
+                pickle.dump({
+                    'ids': shard_ids.tolist(),
+                    'embeddings': bench_utils.make_embeddings(len(shard_ids), d_embed, seed=args.seed + rank)
+                }, f)
+
+        stats = bench_utils.measure(
+            lambda: load_rec_embedding_dict(polyvore_dir),
+            n_warmup=1, n_iters=max(1, args.n_iters // 4)
+        )
+
+    return [result(
+        'load_rec_embedding_dict', {'n_items': args.n_index_items, 'n_shards': args.n_shards}, stats,
+        args.n_index_items, 'items/s'
+    )]
+
+
+BENCHMARKS = {
+    'clip_item_encoding': bench_clip_item_encoding,
+    'predict_score': bench_predict_score,
+    'embed_query': bench_embed_query,
+    'embed_item': bench_embed_item,
+    'faiss': bench_faiss,
+    'load_rec_embedding_dict': bench_load_rec_embedding_dict,
+}
+
+
+def get_meta(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'device': args.device,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'faiss': faiss.__version__,
+        'n_threads': torch.get_num_threads(),
+    }
+
+
+def main(args):
+    model = load_tiny_model(device=args.device, seed=args.seed)
+
+    results = []
+    for name in args.benchmarks:
+        print(f"[Bench] {name}")
+        if args.profile_dir:
+            profiler.reset()
+            with profiler.trace(os.path.join(args.profile_dir, f'{name}_trace.json')):
+                results += BENCHMARKS[name](args, model)
+            profiler.export_stats(os.path.join(args.profile_dir, f'{name}_stages.json'))
+        else:
+            results += BENCHMARKS[name](args, model)
+
+    output = {'meta': get_meta(args), 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=4, sort_keys=True)
+    print(f"[Bench] Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
@@ -0,0 +1,111 @@
+"""Randomly initialized, download-free OutfitCLIPTransformer for benchmarking.
+
+The CLIP backbones keep the real projection size (512) so every tensor downstream of the
+item encoder has production shapes; only the CLIP towers themselves are shrunk.
+"""
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+
+import torch
+from transformers import (
+    CLIPImageProcessor,
+    CLIPTextConfig,
+    CLIPTextModelWithProjection,
+    CLIPTokenizer,
+    CLIPVisionConfig,
+    CLIPVisionModelWithProjection,
+)
+from transformers.models.clip.tokenization_clip import bytes_to_unicode
+
+from ..models.modules.encoder import CLIPItemEncoder
+from ..models.modules.image_encoder import BaseImageEncoder, CLIPImageEncoder
+from ..models.modules.text_encoder import BaseTextEncoder, CLIPTextEncoder
+from ..models.outfit_clip_transformer import OutfitCLIPTransformer, OutfitCLIPTransformerConfig
+from ..utils.model_utils import freeze_model
+
+PROJECTION_DIM = 512
+IMAGE_SIZE = 32
+
+
+@dataclass
+class TinyOutfitCLIPTransformerConfig(OutfitCLIPTransformerConfig):
+    transformer_n_layers: int = 2
+    transformer_d_ffn: int = 512
+    transformer_dropout: float = 0.0
+
+
+def build_byte_level_tokenizer() -> CLIPTokenizer:
+    """CLIP tokenizer over raw bytes (no merges), written to a temporary directory."""
+    vocab = list(bytes_to_unicode().values())
+    vocab = vocab + [token + '</w>' for token in vocab] + ['<|startoftext|>', '<|endoftext|>']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vocab_file = os.path.join(tmp_dir, 'vocab.json')
+        merges_file = os.path.join(tmp_dir, 'merges.txt')
+        with open(vocab_file, 'w', encoding='utf-8') as f:
+            json.dump({token: i for i, token in enumerate(vocab)}, f)
+        with open(merges_file, 'w', encoding='utf-8') as f:
+            f.write('#version: 0.2\n')
+
+        return CLIPTokenizer(vocab_file=vocab_file, merges_file=merges_file)
+
+
+class TinyCLIPImageEncoder(CLIPImageEncoder):
+
+    def __init__(self):
+        BaseImageEncoder.__init__(self)
+        self.model = CLIPVisionModelWithProjection(CLIPVisionConfig(
+            hidden_size=64, intermediate_size=128, num_hidden_layers=2, num_attention_heads=4,
+            image_size=IMAGE_SIZE, patch_size=8, projection_dim=PROJECTION_DIM
+        ))
+        self.model.eval()
+        freeze_model(self.model)
+        self.processor = CLIPImageProcessor(
+            size={'shortest_edge': IMAGE_SIZE},
+            crop_size={'height': IMAGE_SIZE, 'width': IMAGE_SIZE},
+            do_convert_rgb=False
+        )
+
+
+class TinyCLIPTextEncoder(CLIPTextEncoder):
+
+    def __init__(self):
+        BaseTextEncoder.__init__(self)
+        self.tokenizer = build_byte_level_tokenizer()
+        self.model = CLIPTextModelWithProjection(CLIPTextConfig(
+            vocab_size=len(self.tokenizer), hidden_size=64, intermediate_size=128,
+            num_hidden_layers=2, num_attention_heads=4, max_position_embeddings=64,
+            projection_dim=PROJECTION_DIM,
+            bos_token_id=self.tokenizer.bos_token_id,
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id,
+        ))
+        self.model.eval()
+        freeze_model(self.model)
+
+
+class TinyCLIPItemEncoder(CLIPItemEncoder):
+
+    def _build_encoders(self, model_name):
+        self.image_enc = TinyCLIPImageEncoder()
+        self.text_enc = TinyCLIPTextEncoder()
+
+
+class TinyOutfitCLIPTransformer(OutfitCLIPTransformer):
+
+    def _init_item_enc(self):
+        self.item_enc = TinyCLIPItemEncoder(
+            model_name=None,
+            enc_norm_out=self.cfg.item_enc_norm_out,
+            aggregation_method=self.cfg.aggregation_method
+        )
+
+
+def load_tiny_model(device: str = 'cpu', seed: int = 42, **cfg_kwargs) -> TinyOutfitCLIPTransformer:
+    torch.manual_seed(seed)
+    model = TinyOutfitCLIPTransformer(TinyOutfitCLIPTransformerConfig(**cfg_kwargs))
+    model.to(device)
+    model.eval()
+
+    return model
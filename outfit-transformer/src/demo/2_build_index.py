@@ -21,7 +21,8 @@ from tqdm import tqdm
 
 import wandb
 
-from . import vectorstore
+from .sharded_vectorstore import load_vectorstore
+from .vectorstore_utils import POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR, load_rec_embedding_dict
 from ..data import collate_fn
 from ..data.datasets import polyvore
 from ..models.load import load_model
@@ -34,54 +35,55 @@ LOGS_DIR = SRC_DIR / 'logs'
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR = "{polyvore_dir}/precomputed_rec_embeddings"
-
 
 def parse_args():
     parser = ArgumentParser()
     parser.add_argument('--polyvore_dir', type=str, 
                         default='./datasets/polyvore')
+    parser.add_argument('--changelog', type=str,
+                        default=None)
+    parser.add_argument('--rebuild', action='store_true')
+    parser.add_argument('--n_shards', type=int,
+                        default=1)
+    parser.add_argument('--shard_by', type=str, choices=['hash', 'category'],
+                        default='hash')
     
     return parser.parse_args()
 
 
-def load_rec_embedding_dict(dataset_dir):
-    e_dir = POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR.format(polyvore_dir=dataset_dir)
-    filenames = [filename for filename in os.listdir(e_dir) if filename.endswith(".pkl")]
-    filenames = sorted(filenames, key=lambda x: int(x.split('.')[0].split('_')[-1]))
-    
-    all_ids, all_embeddings = [], []
-    for filename in filenames:
-        filepath = os.path.join(e_dir, filename)
-        with open(filepath, 'rb') as f:
-            data = pickle.load(f)
-            all_ids += data['ids']
-            all_embeddings.append(data['embeddings'])
-            
-    all_embeddings = np.concatenate(all_embeddings, axis=0)
-    print(f"Loaded {len(all_embeddings)} embeddings")
-    
-    all_embeddings_dict = {item_id: embedding for item_id, embedding in zip(all_ids, all_embeddings)}
-    print(f"Created embeddings dictionary")
-    
-    return all_embeddings_dict
-
-
 def main(args):
-    indexer = vectorstore.FAISSVectorStore(
+    indexer = load_vectorstore(
+        n_shards=args.n_shards,
+        shard_by=args.shard_by,
         index_name='rec_index',
         d_embed=128,
         faiss_type='IndexFlatIP',
         base_dir=POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR.format(polyvore_dir=args.polyvore_dir),
     )
-    rec_embedding_dict = load_rec_embedding_dict(args.polyvore_dir)
-    
-    embeddings = list(rec_embedding_dict.values())
-    ids = list(rec_embedding_dict.keys())
+    if args.rebuild or indexer.ntotal() == 0:
+        rec_embedding_dict = load_rec_embedding_dict(args.polyvore_dir)
+        
+        embeddings = list(rec_embedding_dict.values())
+        ids = list(rec_embedding_dict.keys())
+        
+        categories = None
+        if args.n_shards > 1 and args.shard_by == 'category':
+            items = polyvore.PolyvoreItemDataset(
+                args.polyvore_dir, metadata=polyvore.load_metadata(args.polyvore_dir), load_image=False
+            )
+            categories = [items.get_item_by_id(item_id).category for item_id in ids]
+        
+        indexer.reset()
+        if categories is not None:
+            indexer.add(embeddings=embeddings, ids=ids, categories=categories)
+        else:
+            indexer.add(embeddings=embeddings, ids=ids)
     
-    indexer.add(embeddings=embeddings, ids=ids)
+    # Upserts and deletes are idempotent, so replaying over a fresh build is safe
+    indexer.replay_changelog(args.changelog)
     
     indexer.save()
+    indexer.close()
     
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+import functools
+import os
+import pathlib
+from argparse import ArgumentParser
+
+from .thumbnail_cache import POLYVORE_THUMBNAIL_DIR, build_thumbnail_pack
+from ..data.datasets import polyvore
+
+SRC_DIR = pathlib.Path(__file__).parent.parent.parent.absolute()
+LOGS_DIR = SRC_DIR / 'logs'
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--polyvore_dir', type=str, 
+                        default='./datasets/polyvore')
+    parser.add_argument('--size', type=int,
+                        default=256)
+    parser.add_argument('--quality', type=int,
+                        default=85)
+    parser.add_argument('--n_workers', type=int,
+                        default=8)
+    
+    return parser.parse_args()
+
+
+def load_item(items, idx):
+    item = items[idx]
+    
+    return item.item_id, item.image
+
+
+def main(args):
+    metadata = polyvore.load_metadata(args.polyvore_dir)
+    items = polyvore.PolyvoreItemDataset(
+        args.polyvore_dir, metadata=metadata, load_image=True
+    )
+    loaders = [functools.partial(load_item, items, idx) for idx in range(len(items))]
+    
+    build_thumbnail_pack(
+        loaders, 
+        cache_dir=POLYVORE_THUMBNAIL_DIR.format(polyvore_dir=args.polyvore_dir),
+        size=args.size, quality=args.quality, n_workers=args.n_workers
+    )
+    
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import gradio as gr
 from dataclasses import dataclass
@@ -8,6 +9,8 @@ import random
 from argparse import ArgumentParser
 import pathlib
 
+from .inference_worker import InferenceWorker
+from .thumbnail_cache import POLYVORE_THUMBNAIL_DIR, ThumbnailCache
 from .vectorstore import FAISSVectorStore
 from ..models.load import load_model
 from ..data import datatypes
@@ -28,8 +31,6 @@ POLYVORE_CATEGORIES = [
     'shoes', 'accessories', 'scarves', 'hats', 
     'sunglasses', 'jewellery', 'unknown'
 ]
-state_my_items = []
-state_candidate_items = []
 
 
 def parse_args():
@@ -40,6 +41,16 @@ def parse_args():
                         default='./datasets/polyvore')
     parser.add_argument('--checkpoint', type=str, 
                         default=None)
+    parser.add_argument('--thumbnail_size', type=int,
+                        default=256)
+    parser.add_argument('--concurrency_limit', type=int,
+                        default=4)
+    parser.add_argument('--max_queue_size', type=int,
+                        default=64)
+    parser.add_argument('--max_batch_size', type=int,
+                        default=32)
+    parser.add_argument('--max_wait_ms', type=float,
+                        default=10.0)
     
     return parser.parse_args()
 
@@ -49,14 +60,27 @@ def run(args):
     metadata = polyvore.load_metadata(
         args.polyvore_dir
     )
+    # Galleries only show thumbnails; full images are decoded for the selected item only
     items = polyvore.PolyvoreItemDataset(
+        args.polyvore_dir, metadata=metadata, load_image=False
+    )
+    full_items = polyvore.PolyvoreItemDataset(
         args.polyvore_dir, metadata=metadata, load_image=True
     )
+    thumbnails = ThumbnailCache(
+        POLYVORE_THUMBNAIL_DIR.format(polyvore_dir=args.polyvore_dir),
+        size=args.thumbnail_size,
+        fallback=lambda item_id: full_items.get_item_by_id(item_id).image
+    )
     num_pages = len(items) // ITEM_PER_PAGE
     
     def get_items(page):
         idxs = range(page * ITEM_PER_PAGE, (page + 1) * ITEM_PER_PAGE)
         return [items[i] for i in idxs]
+    
+    def prefetch_pages(pages):
+        pages = [page for page in pages if 0 <= page < num_pages]
+        thumbnails.prefetch([item.item_id for page in pages for item in get_items(page)])
 
     
     model = load_model(
@@ -69,8 +93,15 @@ def run(args):
         faiss_type='IndexFlatIP',
         base_dir=POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR.format(polyvore_dir=args.polyvore_dir),
     )
+    # Shared by every session: concurrent clicks are batched into one model call
+    worker = InferenceWorker(
+        model, indexer, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms
+    )
 
     with gr.Blocks() as demo:
+        # Per-session state
+        state_my_items = gr.State(value=[])
+        state_candidate_items = gr.State(value=[])
         state_selected_my_item_index = gr.State(value=None)
         
         with gr.Row(equal_height=True):
@@ -182,46 +213,46 @@ def run(args):
                     )
                     
         # Functions
-        def select_item(selected: gr.SelectData):
+        def select_item(my_items, selected: gr.SelectData):
 
             return {
                 state_selected_my_item_index: selected.index,
-                item_image: state_my_items[selected.index].image,
-                item_description: state_my_items[selected.index].description,
-                item_category: state_my_items[selected.index].category,
+                item_image: my_items[selected.index].image,
+                item_description: my_items[selected.index].description,
+                item_category: my_items[selected.index].category,
             }
         
-        def add_item(item_image, item_description, item_category):
-            global state_my_items
-            
+        def add_item(my_items, item_image, item_description, item_category):
             if item_image is None or item_description is None or item_category is None:
                 gr.Warning("Error: All fields (image, description, and category) must be provided.")
             else:
-                state_my_items.append(
+                my_items = my_items + [
                     datatypes.FashionItem(
-                        id=None,
+                        item_id=None,
                         image=item_image, 
                         description=item_description,
                         category=item_category,
                     )
-                )
+                ]
                 
             return {
-                my_item_gallery: [item.image for item in state_my_items],
+                state_my_items: my_items,
+                my_item_gallery: [item.image for item in my_items],
                 state_selected_my_item_index: None,
             }
         
-        def delete_item(index):
+        def delete_item(my_items, index):
             if index is not None:
-                if index < len(state_my_items):
-                    del state_my_items[index]
+                if index < len(my_items):
+                    my_items = my_items[:index] + my_items[index + 1:]
                 else:
                     gr.Warning("Error: Invalid item index.")
             else:
                 gr.Warning("Error: No item selected.")
             
             return {
-                my_item_gallery: [item.image for item in state_my_items],
+                state_my_items: my_items,
+                my_item_gallery: [item.image for item in my_items],
                 state_selected_my_item_index: None,
                 item_image: None,
                 item_description: None,
@@ -229,112 +260,95 @@ def run(args):
             }
         
         def select_page_from_polyvore(page):
-            global state_candidate_items
-            
             page = page - 1
-            state_candidate_items = get_items(page)
+            candidate_items = get_items(page)
+            gallery = thumbnails.get_many([item.item_id for item in candidate_items])
+            prefetch_pages([page + 1, page - 1])
             
             return {
-                polyvore_gallery: [item.image for item in state_candidate_items],
+                state_candidate_items: candidate_items,
+                polyvore_gallery: gallery,
             }
         
-        def select_item_from_polyvore(selected: gr.SelectData):
-            selected_item = state_candidate_items[selected.index]
+        def select_item_from_polyvore(candidate_items, selected: gr.SelectData):
+            selected_item = candidate_items[selected.index]
             
             return {
-                item_image: selected_item.image,
+                item_image: full_items.get_item_by_id(selected_item.item_id).image,
                 item_description: selected_item.description,
                 item_category: selected_item.category,
             }
         
-        @torch.no_grad()
-        def compute_score():
-            if len(state_my_items) == 0:
+        async def compute_score(my_items):
+            if len(my_items) == 0:
                 gr.Warning("Error: No items to compute score.")
                 return {
                     computed_score: None
                 }
-            query = datatypes.FashionCompatibilityQuery(
-                outfit=state_my_items
-            )
-            s = model.predict_score(
-                query= [query],
-                use_precomputed_embedding=False
-            )[0].detach().cpu()
-            s = float(s)
+            s = await worker.score(my_items)
             
             return {
                 computed_score: s
             }
         
-        @torch.no_grad()
-        def search_item():
-            if len(state_my_items) == 0:
+        async def search_item(my_items):
+            if len(my_items) == 0:
                 gr.Warning("Error: No items to search.")
                 return {
                     searched_item_gallery: []
                 }
-            query = datatypes.FashionComplementaryQuery(
-                outfit=state_my_items,
-                category='Unknown'
-            )
-            
-            e = model.embed_query(
-                query=[query],
-                use_precomputed_embedding=False
-            ).detach().cpu().numpy().tolist()
-            
-            res = indexer.search(
-                embeddings=e,
-                k=ITEM_PER_SEARCH
-            )[0]
+            res = await worker.search(my_items, k=ITEM_PER_SEARCH)
+            # Thumbnail misses read from disk; keep them off the event loop.
+            gallery = await asyncio.to_thread(thumbnails.get_many, [r[1] for r in res])
             
             return {
-                searched_item_gallery: [items.get_item_by_id(r[1]).image for r in res]
+                searched_item_gallery: gallery
             }
             
         
         # Event Handlers
         my_item_gallery.select(
             select_item,
-            inputs=None,
+            inputs=[state_my_items],
             outputs=[state_selected_my_item_index, item_image, item_description, item_category]
         )
         btn_item_add.click(
             add_item, 
-            inputs=[item_image, item_description, item_category], 
-            outputs=[my_item_gallery, state_selected_my_item_index]
+            inputs=[state_my_items, item_image, item_description, item_category], 
+            outputs=[state_my_items, my_item_gallery, state_selected_my_item_index]
         )
         btn_item_delete.click(
             delete_item,
-            inputs=state_selected_my_item_index,
-            outputs=[my_item_gallery, state_selected_my_item_index, item_image, item_description, item_category]
+            inputs=[state_my_items, state_selected_my_item_index],
+            outputs=[state_my_items, my_item_gallery, state_selected_my_item_index, item_image, item_description, item_category]
         )
         
         polyvore_page.change(
             select_page_from_polyvore,
             inputs=[polyvore_page],
-            outputs=[polyvore_gallery]
+            outputs=[state_candidate_items, polyvore_gallery]
         )
         polyvore_gallery.select(
             select_item_from_polyvore,
-            inputs=None,
+            inputs=[state_candidate_items],
             outputs=[item_image, item_description, item_category]
         )
         
         btn_compute_score.click(
             compute_score,
-            inputs=None,
+            inputs=[state_my_items],
             outputs=[computed_score]
         )
         btn_search_item.click(
             search_item,
-            inputs=None,
+            inputs=[state_my_items],
             outputs=[searched_item_gallery]
         )
     
     # Launch
-    demo.launch()
+    demo.queue(
+        default_concurrency_limit=args.concurrency_limit, max_size=args.max_queue_size
+    ).launch()
     
 if __name__ == "__main__":
     args = parse_args()
@@ -0,0 +1,200 @@
+import asyncio
+import base64
+import binascii
+import io
+import os
+import pathlib
+from argparse import ArgumentParser
+from typing import List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from PIL import Image, UnidentifiedImageError
+from pydantic import BaseModel, Field
+
+from .inference_worker import MAX_SEARCH_K, InferenceWorker
+from .sharded_vectorstore import load_vectorstore
+from .vectorstore_utils import POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR
+from ..data import datatypes
+from ..data.datasets import polyvore
+from ..models.load import load_model
+
+SRC_DIR = pathlib.Path(__file__).parent.parent.parent.absolute()
+LOGS_DIR = SRC_DIR / 'logs'
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--model_type', type=str, choices=['original', 'clip'],
+                        default='clip')
+    parser.add_argument('--polyvore_dir', type=str,
+                        default='./datasets/polyvore')
+    parser.add_argument('--checkpoint', type=str,
+                        default=None)
+    parser.add_argument('--host', type=str,
+                        default='0.0.0.0')
+    parser.add_argument('--port', type=int,
+                        default=8002)
+    parser.add_argument('--max_batch_size', type=int,
+                        default=32)
+    parser.add_argument('--max_wait_ms', type=float,
+                        default=5.0)
+    parser.add_argument('--n_shards', type=int,
+                        default=1, help="Number of FAISS shard processes; must match 2_build_index")
+    parser.add_argument('--shard_by', type=str, choices=['hash', 'category'],
+                        default='hash')
+    parser.add_argument('--reload_interval', type=float,
+                        default=30.0, help="Seconds between checks for a new index snapshot (0 disables)")
+
+    return parser.parse_args()
+
+
+class ItemRequest(BaseModel):
+    item_id: Optional[int] = Field(
+        default=None,
+        description="Polyvore item ID; its precomputed embedding is used when available"
+    )
+    category: str = ""
+    description: str = ""
+    image: Optional[str] = Field(
+        default=None,
+        description="Base64 encoded image"
+    )
+
+
+class OutfitRequest(BaseModel):
+    outfit: List[ItemRequest]
+
+
+class SearchRequest(OutfitRequest):
+    k: int = Field(default=8, gt=0, le=MAX_SEARCH_K)
+
+
+class EmbedItemsRequest(BaseModel):
+    items: List[ItemRequest]
+
+
+def create_app(
+    worker: InferenceWorker, 
+    embedding_dict: Optional[dict] = None,
+    reload_interval: float = 0.0,
+) -> FastAPI:
+    app = FastAPI(title="Outfit Transformer Inference API")
+    embedding_dict = embedding_dict or {}
+    reload_task = None
+
+    def to_fashion_item(item: ItemRequest) -> datatypes.FashionItem:
+        embedding = embedding_dict.get(item.item_id) if item.item_id is not None else None
+        image = None
+        if embedding is None:
+            if item.image is None:
+                raise HTTPException(status_code=400, detail=f"Item {item.item_id} needs an image or a known item_id")
+            try:
+                image = Image.open(io.BytesIO(base64.b64decode(item.image))).convert('RGB')
+            except (binascii.Error, ValueError, UnidentifiedImageError, OSError) as e:
+                raise HTTPException(status_code=400, detail=f"Item {item.item_id} has an invalid image: {e}")
+
+        return datatypes.FashionItem(
+            item_id=item.item_id, category=item.category, description=item.description,
+            image=image, embedding=embedding
+        )
+
+    async def to_fashion_items(items: List[ItemRequest]) -> List[datatypes.FashionItem]:
+        # base64 and PIL decoding are CPU-bound; keep them off the event loop.
+        return await asyncio.to_thread(lambda: [to_fashion_item(item) for item in items])
+
+    async def to_outfit(items: List[ItemRequest]) -> List[datatypes.FashionItem]:
+        if not items:
+            raise HTTPException(status_code=400, detail="Outfit must contain at least one item")
+        return await to_fashion_items(items)
+
+    @app.post("/score")
+    async def score(request: OutfitRequest):
+        return {"score": await worker.score(await to_outfit(request.outfit))}
+
+    @app.post("/search")
+    async def search(request: SearchRequest):
+        results = await worker.search(await to_outfit(request.outfit), k=request.k)
+        return {"results": [{"item_id": item_id, "score": score} for score, item_id in results if item_id != -1]}
+
+    @app.post("/embed-items")
+    async def embed_items(request: EmbedItemsRequest):
+        items = await to_fashion_items(request.items)
+        embeddings = await asyncio.gather(*[worker.embed_item(item) for item in items])
+        return {"embeddings": [np.asarray(embedding).tolist() for embedding in embeddings]}
+
+    async def reload_index() -> bool:
+        if worker.indexer is None:
+            return False
+        return await asyncio.get_running_loop().run_in_executor(None, worker.indexer.reload)
+
+    async def poll_index():
+        while True:
+            await asyncio.sleep(reload_interval)
+            try:
+                await reload_index()
+            except Exception as e:
+                print(f"[Serve] Index reload failed: {e}")
+
+    @app.post("/reload")
+    async def reload():
+        reloaded = await reload_index()
+        return {
+            "reloaded": reloaded,
+            "version": getattr(worker.indexer, 'version', None),
+            "applied_seq": getattr(worker.indexer, 'applied_seq', None),
+        }
+
+    @app.get("/health")
+    async def health():
+        return {
+            "status": "healthy", 
+            "index_version": getattr(worker.indexer, 'version', None),
+            "index_applied_seq": getattr(worker.indexer, 'applied_seq', None),
+            "batchers": worker.stats()
+        }
+
+    @app.on_event("startup")
+    async def startup():
+        nonlocal reload_task
+        if reload_interval > 0 and worker.indexer is not None:
+            reload_task = asyncio.create_task(poll_index())
+
+    @app.on_event("shutdown")
+    def shutdown():
+        if reload_task is not None:
+            reload_task.cancel()
+        worker.close()
+
+    return app
+
+
+def run(args):
+    model = load_model(
+        model_type=args.model_type, checkpoint=args.checkpoint
+    )
+    model.eval()
+    indexer = load_vectorstore(
+        n_shards=args.n_shards,
+        shard_by=args.shard_by,
+        index_name='rec_index',
+        d_embed=128,
+        faiss_type='IndexFlatIP',
+        base_dir=POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR.format(polyvore_dir=args.polyvore_dir),
+    )
+    embedding_dict = polyvore.load_embedding_dict(args.polyvore_dir)
+
+    worker = InferenceWorker(
+        model, indexer, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms
+    )
+    app = create_app(worker, embedding_dict, reload_interval=args.reload_interval)
+
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args)
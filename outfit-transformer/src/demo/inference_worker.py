@@ -0,0 +1,201 @@
+# -*- coding:utf-8 -*-
+"""
+Micro-batching inference worker shared by the demo app and the inference server.
+
+Concurrent requests are queued per task and coalesced into one model call once
+`max_batch_size` requests are pending or the oldest one has waited `max_wait_ms`.
+Model calls run on a dedicated single-thread executor, so the event loop never blocks
+and the model is never entered from two threads at once.
+"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from ..data.datatypes import FashionCompatibilityQuery, FashionComplementaryQuery, FashionItem
+from .vectorstore import FAISSVectorStore
+
+# Search requests share one FAISS call sized by the largest k in the batch, so k is bounded
+# per request before it is queued.
+MAX_SEARCH_K = 100
+
+
+class MicroBatcher:
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        executor: Executor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.n_requests = 0
+        self.n_batches = 0
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, request: Any) -> Any:
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((request, future))
+
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return [(request, future) for request, future in batch if not future.cancelled()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            requests = [request for request, _ in batch]
+            try:
+                results = await self._loop.run_in_executor(self.executor, self.batch_fn, requests)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self.n_requests += len(batch)
+            self.n_batches += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'n_requests': self.n_requests,
+            'n_batches': self.n_batches,
+            'mean_batch_size': self.n_requests / self.n_batches if self.n_batches else 0.0,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class InferenceWorker:
+    """Batched `predict_score` / `embed_query` / `embed_item` and FAISS search behind async calls."""
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        indexer: Optional[FAISSVectorStore] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.model = model
+        self.indexer = indexer
+        self.model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model')
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='faiss')
+        batcher_kwargs = dict(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.batchers = {
+            'score': MicroBatcher(self._score_batch, self.model_executor, **batcher_kwargs),
+            'embed_query': MicroBatcher(self._embed_query_batch, self.model_executor, **batcher_kwargs),
+            'embed_item': MicroBatcher(self._embed_item_batch, self.model_executor, **batcher_kwargs),
+            'search': MicroBatcher(self._search_batch, self.search_executor, **batcher_kwargs),
+        }
+
+    async def score(self, outfit: List[FashionItem]) -> float:
+        return await self.batchers['score'].submit(outfit)
+
+    async def embed_query(self, outfit: List[FashionItem]) -> np.ndarray:
+        return await self.batchers['embed_query'].submit(outfit)
+
+    async def embed_item(self, item: FashionItem) -> np.ndarray:
+        return await self.batchers['embed_item'].submit(item)
+
+    async def search(self, outfit: List[FashionItem], k: int) -> List[Tuple[float, int]]:
+        if self.indexer is None:
+            raise RuntimeError("InferenceWorker was created without an index.")
+        if not 0 < k <= MAX_SEARCH_K:
+            raise ValueError(f"k must be between 1 and {MAX_SEARCH_K}, got {k}.")
+        embedding = await self.embed_query(outfit)
+
+        return await self.batchers['search'].submit((embedding, k))
+
+    def _prepare(self, items: List[FashionItem]) -> bool:
+        """Fills missing backbone embeddings in one batch (CLIP models only, cached on the item).
+        Returns whether the precomputed embedding path can be used."""
+        missing = list({id(item): item for item in items if item.embedding is None}.values())
+        if missing and hasattr(self.model, 'precompute_clip_embedding'):
+            for item, embedding in zip(missing, self.model.precompute_clip_embedding(missing)):
+                item.embedding = embedding
+
+        return all(item.embedding is not None for item in items)
+
+    @torch.no_grad()
+    def _score_batch(self, outfits: List[List[FashionItem]]) -> List[float]:
+        use_precomputed_embedding = self._prepare([item for outfit in outfits for item in outfit])
+        scores = self.model.predict_score(
+            [FashionCompatibilityQuery(outfit=outfit) for outfit in outfits],
+            use_precomputed_embedding=use_precomputed_embedding
+        )
+
+        return scores.squeeze(-1).detach().cpu().tolist()
+
+    @torch.no_grad()
+    def _embed_query_batch(self, outfits: List[List[FashionItem]]) -> List[np.ndarray]:
+        use_precomputed_embedding = self._prepare([item for outfit in outfits for item in outfit])
+        embeddings = self.model.embed_query(
+            [FashionComplementaryQuery(outfit=outfit, category='Unknown') for outfit in outfits],
+            use_precomputed_embedding=use_precomputed_embedding
+        )
+
+        return list(embeddings.detach().cpu().numpy())
+
+    @torch.no_grad()
+    def _embed_item_batch(self, items: List[FashionItem]) -> List[np.ndarray]:
+        use_precomputed_embedding = self._prepare(items)
+        embeddings = self.model.embed_item(items, use_precomputed_embedding=use_precomputed_embedding)
+
+        return list(embeddings.detach().cpu().numpy())
+
+    def _search_batch(self, requests: List[Tuple[np.ndarray, int]]) -> List[List[Tuple[float, int]]]:
+        max_k = max(k for _, k in requests)
+        results = self.indexer.search(
+            np.stack([embedding for embedding, _ in requests]), k=max_k
+        )
+
+        return [result[:k] for result, (_, k) in zip(results, requests)]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
+    def close(self):
+        for batcher in self.batchers.values():
+            batcher.close()
+        self.model_executor.shutdown(wait=False)
+        self.search_executor.shutdown(wait=False)
+        if self.indexer is not None:
+            self.indexer.close()
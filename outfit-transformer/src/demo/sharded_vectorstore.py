@@ -0,0 +1,406 @@
+# -*- coding:utf-8 -*-
+"""
+Sharded FAISS vector store.
+
+Items are split across `n_shards` worker processes, each owning a `FAISSVectorStore` in its
+own directory. Searches are scattered to every shard in one batch and the per-shard top-k
+lists are merged with a heap. Shards talk to the store through `ShardClient.send` / `recv`
+only, so a client backed by a remote process can replace the local one later.
+"""
+import heapq
+import itertools
+import json
+import multiprocessing as mp
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+
+from . import vectorstore_utils
+
+# Methods of FAISSVectorStore that a shard worker may run
+SHARD_METHODS = ('add', 'upsert', 'delete', 'compact', 'search', 'save', 'reload', 'reset', 'ntotal', 'ids')
+
+
+def _shard_worker(conn, store_kwargs: Dict[str, Any], n_threads: int):
+    import faiss
+    from .vectorstore import FAISSVectorStore
+
+    # Every shard runs its own OpenMP pool; keep the total at about one thread per core
+    faiss.omp_set_num_threads(n_threads)
+    store = FAISSVectorStore(**store_kwargs)
+    while True:
+        method, args, kwargs = conn.recv()
+        if method == 'close':
+            conn.close()
+            break
+        try:
+            conn.send((True, getattr(store, method)(*args, **kwargs)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class ShardClient:
+    """One local shard process."""
+
+    def __init__(
+        self,
+        store_kwargs: Dict[str, Any],
+        n_threads: int = 1,
+    ):
+        ctx = mp.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_shard_worker, args=(child_conn, store_kwargs, n_threads), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def send(self, method: str, *args, **kwargs):
+        if method not in SHARD_METHODS:
+            raise ValueError(f"Invalid shard method: {method}")
+        self.conn.send((method, args, kwargs))
+
+    def recv(self) -> Any:
+        ok, result = self.conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send(('close', (), {}))
+            self.process.join(timeout=10)
+        self.conn.close()
+
+
+class ShardedFAISSVectorStore:
+
+    def __init__(
+        self,
+        index_name: str = 'index',
+        faiss_type: str = 'IndexFlatL2',
+        base_dir: str = Path.cwd(),
+        d_embed: int = 128,
+        n_shards: int = 4,
+        shard_by: Literal['hash', 'category'] = 'hash',
+        n_threads_per_shard: Optional[int] = None,
+        **store_kwargs
+    ):
+        if shard_by not in ('hash', 'category'):
+            raise ValueError(f"Invalid shard_by: {shard_by}")
+        self.shards_dir = os.path.join(base_dir, f"{index_name}.shards")
+        self.layout_path = os.path.join(self.shards_dir, 'layout.json')
+        self.changelog_path = os.path.join(base_dir, f"{index_name}.changelog.jsonl")
+        self.n_shards = n_shards
+        self.shard_by = shard_by
+        self.category_to_shard: Dict[str, int] = {}
+        self.applied_seq = 0 # Last changelog entry reflected in the shards
+        self.version: Optional[List[int]] = None # Per-shard snapshot versions recorded in layout.json
+        # shard_by='category' only: shard holding each id, read from the shards on first use
+        self._id_to_shard: Optional[Dict[int, int]] = None
+        # Larger scores are better for inner product, smaller for L2 distance
+        self.largest_first = faiss_type == 'IndexFlatIP'
+        self._lock = threading.Lock()
+
+        self._load_layout()
+
+        if n_threads_per_shard is None:
+            n_threads_per_shard = max(1, (os.cpu_count() or 1) // n_shards)
+        for rank in range(n_shards):
+            os.makedirs(os.path.join(self.shards_dir, f'shard_{rank}'), exist_ok=True)
+        self.shards = [
+            ShardClient(
+                dict(
+                    index_name=index_name, faiss_type=faiss_type, d_embed=d_embed,
+                    base_dir=os.path.join(self.shards_dir, f'shard_{rank}'), **store_kwargs
+                ),
+                n_threads=n_threads_per_shard
+            )
+            for rank in range(n_shards)
+        ]
+
+    def _load_layout(self) -> bool:
+        """Reads `category_to_shard`, `applied_seq` and `version` from layout.json. Returns whether it exists."""
+        if not os.path.exists(self.layout_path):
+            return False
+        with open(self.layout_path, 'r') as f:
+            layout = json.load(f)
+        if (layout['n_shards'], layout['shard_by']) != (self.n_shards, self.shard_by):
+            raise ValueError(
+                f"{self.shards_dir} was built with n_shards={layout['n_shards']}, shard_by={layout['shard_by']}; "
+                f"rebuild it to use n_shards={self.n_shards}, shard_by={self.shard_by}"
+            )
+        self.category_to_shard = layout['category_to_shard']
+        self.applied_seq = layout.get('applied_seq', 0)
+        self.version = layout.get('versions')
+
+        return True
+
+    def _shard_of_id(self, item_id: int) -> int:
+        # Knuth multiplicative hash, so sequential ids spread evenly and assignment is stable across runs
+        return (int(item_id) * 2654435761 % 2**32) % self.n_shards
+
+    def _shard_of_category(self, category: str) -> int:
+        if category not in self.category_to_shard:
+            load = np.bincount(list(self.category_to_shard.values()), minlength=self.n_shards)
+            self.category_to_shard[category] = int(np.argmin(load))
+        return self.category_to_shard[category]
+
+    def _route_categories(
+        self,
+        ids: List[int],
+        categories: Optional[List[str]],
+    ) -> List[int]:
+        if categories is None or len(categories) != len(ids):
+            raise ValueError("shard_by='category' needs one category per id")
+        return [self._shard_of_category(category) for category in categories]
+
+    def _route(
+        self,
+        ids: List[int],
+        categories: Optional[List[str]] = None,
+    ) -> Dict[int, List[int]]:
+        """Positions of `ids` grouped by shard."""
+        if self.shard_by == 'category':
+            shards = self._route_categories(ids, categories)
+        else:
+            shards = [self._shard_of_id(item_id) for item_id in ids]
+        positions = defaultdict(list)
+        for position, shard in enumerate(shards):
+            positions[shard].append(position)
+
+        return positions
+
+    def _scatter(self, calls: Dict[int, Tuple[str, tuple, dict]]) -> Dict[int, Any]:
+        """Sends every call before waiting on any, so shards work in parallel."""
+        with self._lock:
+            for rank, (method, args, kwargs) in calls.items():
+                self.shards[rank].send(method, *args, **kwargs)
+            results, error = {}, None
+            for rank in calls:
+                try:
+                    results[rank] = self.shards[rank].recv()
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+
+        return results
+
+    def _broadcast(self, method: str, *args, **kwargs) -> List[Any]:
+        results = self._scatter({rank: (method, args, kwargs) for rank in range(self.n_shards)})
+        return [results[rank] for rank in range(self.n_shards)]
+
+    def _id_shards(self) -> Dict[int, int]:
+        if self._id_to_shard is None:
+            self._id_to_shard = {
+                int(item_id): rank
+                for rank, ids in enumerate(self._broadcast('ids')) for item_id in ids
+            }
+        return self._id_to_shard
+
+    def _write(
+        self,
+        method: str,
+        embeddings: List[List[float]],
+        ids: List[int],
+        categories: Optional[List[str]] = None,
+    ) -> None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        routes = self._route(ids, categories)
+        calls = {}
+        for rank, positions in routes.items():
+            calls[rank] = (method, (embeddings[positions], [int(ids[p]) for p in positions]), {})
+        self._scatter(calls)
+        if self.shard_by == 'category':
+            id_shards = self._id_shards()
+            for rank, positions in routes.items():
+                id_shards.update((int(ids[p]), rank) for p in positions)
+
+    def add(
+        self,
+        embeddings: List[List[float]],
+        ids: List[int],
+        categories: Optional[List[str]] = None,
+    ) -> None:
+        self._write('add', embeddings, ids, categories)
+
+    def upsert(
+        self,
+        embeddings: List[List[float]],
+        ids: List[int],
+        categories: Optional[List[str]] = None,
+    ) -> None:
+        if self.shard_by == 'category':
+            # Drop the copy on the previous shard of items whose category moved them
+            id_shards = self._id_shards()
+            moved = [
+                item_id for item_id, rank in zip(ids, self._route_categories(ids, categories))
+                if id_shards.get(int(item_id), rank) != rank
+            ]
+            if moved:
+                self.delete(moved)
+        self._write('upsert', embeddings, ids, categories)
+
+    def delete(
+        self,
+        ids: List[int],
+    ) -> None:
+        ids = [int(i) for i in ids]
+        if self.shard_by == 'category':
+            # Ids on no shard have nothing to delete
+            id_shards = self._id_shards()
+            by_shard = defaultdict(list)
+            for item_id in ids:
+                if item_id in id_shards:
+                    by_shard[id_shards[item_id]].append(item_id)
+            self._scatter({rank: ('delete', (shard_ids,), {}) for rank, shard_ids in by_shard.items()})
+            for item_id in ids:
+                id_shards.pop(item_id, None)
+            return
+        calls = {}
+        for rank, positions in self._route(ids).items():
+            calls[rank] = ('delete', ([ids[p] for p in positions],), {})
+        self._scatter(calls)
+
+    def _merge(self, per_shard: List[List[Tuple[float, int]]], k: int) -> List[Tuple[float, int]]:
+        candidates = (
+            (score, item_id) for score, item_id in itertools.chain.from_iterable(per_shard)
+            if item_id != -1
+        )
+        select = heapq.nlargest if self.largest_first else heapq.nsmallest
+        return select(k, candidates, key=lambda x: x[0])
+
+    def search(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        batch_size: int = 2048,
+        categories: Optional[List[str]] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        """Top-k over all shards. With shard_by='category', `categories` limits the fan-out to the
+        shards holding those categories (other categories sharing a shard may still be returned)."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        ranks = range(self.n_shards)
+        if categories is not None and self.shard_by == 'category':
+            ranks = sorted({self.category_to_shard[c] for c in categories if c in self.category_to_shard})
+        results = self._scatter({rank: ('search', (embeddings, k, batch_size), {}) for rank in ranks})
+
+        return [
+            self._merge([results[rank][i] for rank in results], k)
+            for i in range(len(embeddings))
+        ]
+
+    def multi_vector_search(
+        self,
+        embeddings: List[List[List[float]]],
+        k: int,
+        batch_size: int = 2048,
+    ) -> List[List[int]]:
+        """Same aggregation as `FAISSVectorStore.multi_vector_search`, with every query vector of
+        every outfit scattered in a single batch."""
+        lengths = [len(es) for es in embeddings]
+        results = iter(self.search(np.concatenate([np.asarray(es) for es in embeddings]), 100, batch_size))
+        ids = []
+        for length in lengths:
+            scores = defaultdict(list)
+            for result in itertools.islice(results, length):
+                for score, item_id in result:
+                    scores[item_id].append(score)
+            scores = {item_id: np.mean(score) for item_id, score in scores.items()}
+            scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            ids.append(list(map(lambda x: x[0], scores))[:k])
+
+        return ids
+
+    def replay_changelog(
+        self,
+        changelog_path: Optional[str] = None,
+    ) -> int:
+        """Applies changelog entries newer than `applied_seq`. Returns the number of entries applied."""
+        entries = vectorstore_utils.read_changelog(
+            changelog_path or self.changelog_path, after_seq=self.applied_seq
+        )
+        for entry in entries:
+            if entry['op'] not in ('upsert', 'delete'):
+                raise ValueError(f"Invalid changelog op: {entry['op']}")
+            if self.shard_by == 'category' and entry['op'] == 'upsert' and 'categories' not in entry:
+                raise ValueError(
+                    f"Changelog entry {entry['seq']} has no categories; shard_by='category' needs "
+                    f"append_changelog(..., categories=...) for every upsert"
+                )
+        for entry in entries:
+            if entry['op'] == 'upsert':
+                self.upsert(embeddings=entry['embeddings'], ids=entry['ids'], categories=entry.get('categories'))
+            else:
+                self.delete(ids=entry['ids'])
+            self.applied_seq = entry['seq']
+        print(f"[FAISS] replayed {len(entries)} changelog entries on {self.n_shards} shards (applied_seq={self.applied_seq})")
+
+        return len(entries)
+
+    def ntotal(self) -> int:
+        return sum(self._broadcast('ntotal'))
+
+    def compact(self) -> None:
+        self._broadcast('compact')
+
+    def reset(self) -> None:
+        self._broadcast('reset')
+        self.category_to_shard = {}
+        self._id_to_shard = {}
+        self.applied_seq = 0
+
+    def reload(self) -> bool:
+        reloaded = any(self._broadcast('reload'))
+        if reloaded:
+            self._id_to_shard = None
+        # Re-read even without a swap: shard processes start asynchronously and may have loaded
+        # a newer snapshot than the layout read in __init__. `save` writes the layout after the
+        # shard snapshots, so reading it last never pairs new shards with an older mapping.
+        self._load_layout()
+
+        return reloaded
+
+    def save(self) -> List[int]:
+        """Publishes a snapshot on every shard and returns their versions."""
+        versions = self._broadcast('save')
+        os.makedirs(self.shards_dir, exist_ok=True)
+        with open(self.layout_path + '.tmp', 'w') as f:
+            json.dump({
+                'n_shards': self.n_shards,
+                'shard_by': self.shard_by,
+                'category_to_shard': self.category_to_shard,
+                'applied_seq': self.applied_seq,
+                'versions': versions,
+            }, f)
+        os.replace(self.layout_path + '.tmp', self.layout_path)
+        self.version = versions
+
+        return versions
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_vectorstore(
+    n_shards: int = 1,
+    shard_by: Literal['hash', 'category'] = 'hash',
+    **kwargs
+):
+    """A single-process `FAISSVectorStore` for `n_shards=1`, a `ShardedFAISSVectorStore` otherwise."""
+    if n_shards <= 1:
+        from .vectorstore import FAISSVectorStore
+        return FAISSVectorStore(**kwargs)
+    return ShardedFAISSVectorStore(n_shards=n_shards, shard_by=shard_by, **kwargs)
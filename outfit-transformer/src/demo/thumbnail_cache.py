@@ -0,0 +1,154 @@
+# -*- coding:utf-8 -*-
+"""
+Packed thumbnail store for the demo galleries.
+
+Thumbnails are JPEG-encoded back to back in `thumbnails.bin`, followed by (item_id, offset,
+length) rows sorted by item_id and a footer locating them. Data and index live in one file,
+published with a single rename. The pack is memory-mapped and decoded thumbnails are kept in
+an in-memory LRU, so a gallery page costs a few small JPEG decodes at most.
+"""
+import io
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ..utils import utils
+
+POLYVORE_THUMBNAIL_DIR = "{polyvore_dir}/thumbnails"
+
+THUMBNAIL_PACK_FILE = 'thumbnails.bin'
+THUMBNAIL_INDEX_DTYPE = np.dtype([('item_id', '<i8'), ('offset', '<i8'), ('length', '<i4')])
+# Last bytes of a pack: magic, then the file offset and row count of the index
+THUMBNAIL_PACK_MAGIC = b'THMBPAK1'
+THUMBNAIL_FOOTER = struct.Struct('<8sqq')
+
+
+def make_thumbnail(image: Image.Image, size: int) -> Image.Image:
+    thumbnail = image.convert('RGB')
+    thumbnail.thumbnail((size, size), Image.Resampling.BILINEAR)
+
+    return thumbnail
+
+
+def encode_thumbnail(image: Image.Image, size: int, quality: int = 85) -> bytes:
+    buffer = io.BytesIO()
+    make_thumbnail(image, size).save(buffer, format='JPEG', quality=quality, optimize=True)
+
+    return buffer.getvalue()
+
+
+def build_thumbnail_pack(
+    loaders: List[Callable[[], Tuple[int, Image.Image]]],
+    cache_dir: str,
+    size: int = 256,
+    quality: int = 85,
+    n_workers: int = 8,
+    batch_size: int = 256,
+):
+    """Writes a thumbnail pack into `cache_dir`. Each loader returns one `(item_id, image)`."""
+    os.makedirs(cache_dir, exist_ok=True)
+    pack_path = os.path.join(cache_dir, THUMBNAIL_PACK_FILE)
+    index = []
+    offset = 0
+
+    def encode(loader):
+        item_id, image = loader()
+        return item_id, encode_thumbnail(image, size, quality)
+
+    with open(pack_path + '.tmp', 'wb') as f, ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for batch in utils.batch_iterable(loaders, batch_size, desc="[Thumbnails] Building"):
+            for item_id, data in executor.map(encode, batch):
+                f.write(data)
+                index.append((item_id, offset, len(data)))
+                offset += len(data)
+        index = np.sort(np.array(index, dtype=THUMBNAIL_INDEX_DTYPE), order='item_id')
+        f.write(index.tobytes())
+        f.write(THUMBNAIL_FOOTER.pack(THUMBNAIL_PACK_MAGIC, offset, len(index)))
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers see either the previous pack or this one, never a data file with another's index
+    os.replace(pack_path + '.tmp', pack_path)
+    print(f"[Thumbnails] {len(index)} thumbnails ({offset / 2**20:.1f} MiB) saved to {cache_dir}")
+
+
+class ThumbnailCache:
+
+    def __init__(
+        self,
+        cache_dir: str,
+        size: int = 256,
+        max_in_memory: int = 2048,
+        fallback: Optional[Callable[[int], Image.Image]] = None,
+        n_prefetch_workers: int = 4,
+    ):
+        """`fallback(item_id)` loads the full image of items missing from the pack."""
+        self.size = size
+        self.max_in_memory = max_in_memory
+        self.fallback = fallback
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=n_prefetch_workers, thread_name_prefix='thumbnail')
+
+        self._data = None
+        self._index = np.empty(0, dtype=THUMBNAIL_INDEX_DTYPE)
+        pack_path = os.path.join(cache_dir, THUMBNAIL_PACK_FILE)
+        if not os.path.exists(pack_path):
+            print(f"[Thumbnails] No pack found in {cache_dir}, falling back to full images")
+            return
+        with open(pack_path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(pack_path) else b''
+        footer = data[-THUMBNAIL_FOOTER.size:]
+        if len(footer) < THUMBNAIL_FOOTER.size or not footer.startswith(THUMBNAIL_PACK_MAGIC):
+            print(f"[Thumbnails] {pack_path} is not a thumbnail pack (built by an older version?); "
+                  f"rebuild it with 2_build_thumbnails. Falling back to full images")
+            return
+        _, index_offset, n_items = THUMBNAIL_FOOTER.unpack(footer)
+        self._index = np.frombuffer(data, dtype=THUMBNAIL_INDEX_DTYPE, count=n_items, offset=index_offset)
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _load(self, item_id: int) -> Optional[Image.Image]:
+        pos = np.searchsorted(self._index['item_id'], item_id)
+        if self._data is not None and pos < len(self._index) and self._index['item_id'][pos] == item_id:
+            offset, length = int(self._index['offset'][pos]), int(self._index['length'][pos])
+            image = Image.open(io.BytesIO(self._data[offset:offset + length]))
+            image.load()
+            return image
+        if self.fallback is not None:
+            return make_thumbnail(self.fallback(item_id), self.size)
+        return None
+
+    def get(self, item_id: int) -> Optional[Image.Image]:
+        with self._lock:
+            if item_id in self._lru:
+                self._lru.move_to_end(item_id)
+                return self._lru[item_id]
+
+        image = self._load(item_id)
+        if image is not None:
+            with self._lock:
+                self._lru[item_id] = image
+                self._lru.move_to_end(item_id)
+                while len(self._lru) > self.max_in_memory:
+                    self._lru.popitem(last=False)
+
+        return image
+
+    def get_many(self, item_ids: List[int]) -> List[Optional[Image.Image]]:
+        return [self.get(item_id) for item_id in item_ids]
+
+    def prefetch(self, item_ids: List[int]):
+        """Decodes thumbnails into memory in the background."""
+        with self._lock:
+            item_ids = [item_id for item_id in item_ids if item_id not in self._lru]
+        for item_id in item_ids:
+            self._prefetcher.submit(self.get, item_id)
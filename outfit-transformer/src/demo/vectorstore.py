@@ -20,7 +20,9 @@ from tqdm import tqdm
 import os
 import faiss
 import pathlib
+import threading
 from collections import defaultdict
+from contextlib import contextmanager
 
 from . import vectorstore_utils
 
@@ -33,16 +35,114 @@ class FAISSVectorStore:
         faiss_type: str = 'IndexFlatL2',
         base_dir: str = Path.cwd(),
         d_embed: int = 128,
-        *faiss_args, **faiss_kwargs
+        *faiss_args, 
+        max_tombstones: int = 1000,
+        mmap: bool = True,
+        **faiss_kwargs
     ):
-        self.index_path = os.path.join(base_dir, f"{index_name}.faiss")
+        """Loads the published snapshot of `index_name` (memory-mapped when `mmap`), falling back
+        to a legacy `{index_name}.faiss` file or a new empty index."""
+        self.index_path = os.path.join(base_dir, f"{index_name}.faiss") # Legacy single-file index
+        self.meta_path = os.path.join(base_dir, f"{index_name}.meta.json")
+        self.snapshots_dir = os.path.join(base_dir, f"{index_name}.snapshots")
+        self.changelog_path = os.path.join(base_dir, f"{index_name}.changelog.jsonl")
+        if mmap and not vectorstore_utils.MMAP_SUPPORTED:
+            print("[FAISS] this faiss version cannot memory-map flat indexes (no IO_FLAG_MMAP_IFC); loading into RAM")
+        self.mmap = mmap and vectorstore_utils.MMAP_SUPPORTED
+        self.faiss_type = faiss_type
+        self.d_embed = d_embed
+        self.faiss_args = faiss_args
+        self.faiss_kwargs = faiss_kwargs
+        self._lock = threading.Lock() # Held by searches and around every change to the index or tombstones
+        self._write_lock = threading.RLock() # Serializes writers
         
-        if vectorstore_utils.faiss_exists(self.index_path):
-            index = faiss.read_index(self.index_path)
+        self.version = None # Snapshot version currently served, None if not loaded from a snapshot
+        self.applied_seq = 0 # Last changelog entry reflected in the index
+        self.mmapped = False # Whether the served index is a read-only memory-mapped snapshot
+        
+        snapshot = vectorstore_utils.current_snapshot(self.snapshots_dir)
+        if snapshot is not None:
+            self._load_snapshot(*snapshot)
+        elif vectorstore_utils.faiss_exists(self.index_path):
+            self.index = vectorstore_utils.read_index(self.index_path, mmap=self.mmap)
+            self.mmapped = self.mmap
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, 'r') as f:
+                    self.applied_seq = json.load(f).get('applied_seq', 0)
         else:
-            index = vectorstore_utils.create_faiss(faiss_type, d_embed, *faiss_args, **faiss_kwargs)
+            self.index = vectorstore_utils.create_faiss(faiss_type, d_embed, *faiss_args, **faiss_kwargs)
+        
+        # Deleted ids stay in the index until the next compaction and are filtered out of results
+        self.tombstones = set()
+        self.max_tombstones = max_tombstones
+        
+        
+    def _load_snapshot(self, version: int, snapshot_path: str) -> None:
+        index, meta = vectorstore_utils.load_snapshot(snapshot_path, mmap=self.mmap)
+        with self._write_lock, self._lock:
+            # Searches hold _lock, so the swap waits for in-flight ones to return
+            self.index = index
+            self.version = version
+            self.applied_seq = meta.get('applied_seq', 0)
+            self.mmapped = self.mmap
+            self.tombstones = set()
+        print(f"[FAISS] loaded snapshot v{version:06d} ({index.ntotal} vectors)")
+        
+        
+    def reload(self) -> bool:
+        """Swaps to the latest published snapshot if it is newer than the one being served.
+        Unsaved mutations of this instance are discarded. Returns whether a swap happened."""
+        snapshot = vectorstore_utils.current_snapshot(self.snapshots_dir)
+        if snapshot is None or snapshot[0] == self.version:
+            return False
+        self._load_snapshot(*snapshot)
         
-        self.index = index
+        return True
+        
+        
+    @contextmanager
+    def _writing(self):
+        """Yields the index for writers to mutate in place, holding `_lock` around each FAISS call.
+        A memory-mapped snapshot is read-only, so the first write after loading one copies it into
+        RAM: O(ntotal) time and, until the mapping is dropped, twice the index in memory. Writes
+        to an index already in RAM copy nothing."""
+        with self._write_lock:
+            if self.mmapped:
+                # clone_index would share the mapped read-only storage; a round trip copies it
+                index = faiss.deserialize_index(faiss.serialize_index(self.index))
+                with self._lock:
+                    self.index = index
+                    self.mmapped = False
+            yield self.index
+            
+            
+    def ntotal(self) -> int:
+        return self.index.ntotal
+            
+            
+    def ids(self) -> np.ndarray:
+        """Ids currently in the index, tombstoned ones excluded."""
+        with self._lock:
+            ids = faiss.vector_to_array(self.index.id_map)
+            tombstones = self.tombstones
+        if tombstones:
+            ids = ids[~np.isin(ids, np.fromiter(tombstones, dtype=np.int64))]
+        
+        return ids
+            
+            
+    def close(self) -> None:
+        """No-op; mirrors `ShardedFAISSVectorStore.close`."""
+            
+            
+    def reset(self) -> None:
+        """Replaces the index with an empty one, e.g. before a full rebuild."""
+        index = vectorstore_utils.create_faiss(self.faiss_type, self.d_embed, *self.faiss_args, **self.faiss_kwargs)
+        with self._write_lock, self._lock:
+            self.index = index
+            self.mmapped = False
+            self.applied_seq = 0
+            self.tombstones = set()
         
         
     def add(
@@ -51,7 +151,87 @@ class FAISSVectorStore:
         ids: List[int],
         batch_size: int = 1000,
     ) -> None:
-        return vectorstore_utils.add(self.index, embeddings, ids, batch_size)
+        with self._writing() as index:
+            return vectorstore_utils.add(index, embeddings, ids, batch_size, lock=self._lock)
+            
+            
+    def upsert(
+        self, 
+        embeddings: List[List[float]], 
+        ids: List[int],
+        batch_size: int = 1000,
+    ) -> None:
+        """Adds new ids and replaces the embeddings of existing ones."""
+        ids = [int(i) for i in ids]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._writing() as index:
+            # Checked before removing anything, so a bad batch leaves the index untouched
+            if embeddings.shape != (len(ids), index.d):
+                raise ValueError(f"Expected {len(ids)} embeddings of size {index.d}, got shape {embeddings.shape}")
+            with self._lock:
+                vectorstore_utils.remove(index, ids)
+                vectorstore_utils.add(index, embeddings, ids, batch_size)
+                self.tombstones = self.tombstones.difference(ids)
+        
+        
+    def delete(
+        self,
+        ids: List[int],
+    ) -> None:
+        self._tombstone(ids)
+        self._maybe_compact()
+            
+            
+    def _tombstone(self, ids: List[int]) -> None:
+        with self._lock:
+            # Replaced rather than mutated, the set is handed to searches without copying
+            self.tombstones = self.tombstones.union(int(i) for i in ids)
+            
+            
+    def _maybe_compact(self) -> None:
+        if len(self.tombstones) >= self.max_tombstones:
+            self.compact()
+            
+            
+    def compact(self) -> None:
+        """Physically removes tombstoned ids from the index."""
+        with self._write_lock:
+            if not self.tombstones:
+                return
+            with self._writing() as index, self._lock:
+                vectorstore_utils.remove(index, list(self.tombstones))
+                self.tombstones = set()
+        
+        
+    def replay_changelog(
+        self,
+        changelog_path: Optional[str] = None,
+    ) -> int:
+        """Applies changelog entries newer than `applied_seq`. Returns the number of entries applied."""
+        entries = vectorstore_utils.read_changelog(
+            changelog_path or self.changelog_path, after_seq=self.applied_seq
+        )
+        for entry in entries:
+            if entry['op'] not in ('upsert', 'delete'):
+                raise ValueError(f"Invalid changelog op: {entry['op']}")
+        with self._write_lock:
+            # Entries change the index one at a time, so on error applied_seq stops at the last one
+            # that reached it and the next replay resumes from there
+            applied_seq = self.applied_seq
+            try:
+                for entry in entries:
+                    if entry['op'] == 'upsert':
+                        self.upsert(embeddings=entry['embeddings'], ids=entry['ids'])
+                    else:
+                        # Compacted once after the loop rather than on every delete past the limit
+                        self._tombstone(entry['ids'])
+                    applied_seq = entry['seq']
+            finally:
+                self.applied_seq = applied_seq
+                self._maybe_compact()
+        print(f"[FAISS] replayed {len(entries)} changelog entries (applied_seq={self.applied_seq})")
+            
+        return len(entries)
             
             
     def search(
@@ -60,11 +240,28 @@ class FAISSVectorStore:
         k: int,
         batch_size: int = 2048,
     ) -> List[Tuple[float, int]]:
-        return vectorstore_utils.search(self.index, embeddings, k, batch_size)
+        # Held for the whole search; writers only take it for the duration of each FAISS call
+        with self._lock:
+            tombstones = self.tombstones
+            if not tombstones:
+                return vectorstore_utils.search(self.index, embeddings, k, batch_size)
+            results = vectorstore_utils.search(self.index, embeddings, k + len(tombstones), batch_size)
+        
+        return [
+            [(score, item_id) for score, item_id in result if item_id not in tombstones][:k]
+            for result in results
+        ]
     
     
-    def save(self):
-        vectorstore_utils.save(self.index, self.index_path)
+    def save(self, keep: int = 3) -> int:
+        """Publishes the index as a new snapshot version and returns the version."""
+        with self._write_lock:
+            self.compact()
+            self.version = vectorstore_utils.save_snapshot(
+                self.index, self.snapshots_dir, meta={'applied_seq': self.applied_seq}, keep=keep
+            )
+        
+        return self.version
         
         
     def multi_vector_search(
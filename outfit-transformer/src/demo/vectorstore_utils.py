@@ -15,10 +15,17 @@ from typing import Literal
 import numpy as np
 
 import faiss
+import pickle
+import shutil
 from tqdm import tqdm
 import pathlib
+import threading
+from contextlib import nullcontext
 
 from ..utils import utils
+from ..utils import profiler
+
+POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR = "{polyvore_dir}/precomputed_rec_embeddings"
 
 
 def faiss_exists(index_path):
@@ -57,11 +64,23 @@ def add(
     embeddings: List[List[float]], 
     ids: List[int],
     batch_size: int = 2048,
+    lock: Optional[threading.Lock] = None,
 ):
+    """Adds in batches; `lock` is held around each batch so searches can run in between."""
     iterable = tuple(zip(embeddings, ids))
     for batch in utils.batch_iterable(iterable, batch_size, desc="[FAISS] Adding"):
         embeddings, ids = zip(*batch)
-        index.add_with_ids(np.array(embeddings), np.array(ids))
+        with profiler.record('faiss.add'), lock or nullcontext():
+            index.add_with_ids(np.array(embeddings), np.array(ids))
+
+
+def remove(
+    index: faiss.Index, 
+    ids: List[int],
+) -> int:
+    if len(ids) == 0:
+        return 0
+    return index.remove_ids(np.array(ids, dtype=np.int64))
 
 
 def search(
@@ -72,9 +91,10 @@ def search(
 ) -> List[Tuple[float, int]]:
     outputs = []
     for batch in utils.batch_iterable(embeddings, batch_size, desc="[FAISS] Searching"):
-        scores, faiss_ids = index.search(
-            np.array(batch), k=k
-        )
+        with profiler.record('faiss.search'):
+            scores, faiss_ids = index.search(
+                np.array(batch), k=k
+            )
         scores = scores.tolist()
         faiss_ids = faiss_ids.tolist()
         for scores_, faiss_ids_ in zip(scores, faiss_ids):
@@ -88,4 +108,192 @@ def save(
     index_path: str
 ):
     faiss.write_index(index, index_path)
-    print("[FAISS] saved")
\ No newline at end of file
+    print("[FAISS] saved")
+
+
+SNAPSHOT_INDEX_FILE = 'index.faiss'
+SNAPSHOT_META_FILE = 'meta.json'
+SNAPSHOT_CURRENT_FILE = 'CURRENT'
+
+
+def _fsync(path: str):
+    """fsync a file or directory by path."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def list_snapshots(
+    snapshots_dir: str,
+) -> List[int]:
+    if not os.path.isdir(snapshots_dir):
+        return []
+    return sorted(
+        int(name[1:]) for name in os.listdir(snapshots_dir)
+        if name.startswith('v') and name[1:].isdigit()
+    )
+
+
+def current_snapshot(
+    snapshots_dir: str,
+) -> Optional[Tuple[int, str]]:
+    """(version, path) of the published snapshot, or None if nothing was published yet."""
+    current_path = os.path.join(snapshots_dir, SNAPSHOT_CURRENT_FILE)
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path, 'r') as f:
+        name = f.read().strip()
+
+    return int(name[1:]), os.path.join(snapshots_dir, name)
+
+
+def save_snapshot(
+    index: faiss.Index,
+    snapshots_dir: str,
+    meta: Optional[dict] = None,
+    keep: int = 3,
+) -> int:
+    """Writes `index` as a new snapshot version and publishes it atomically.
+
+    The snapshot is written into a temporary directory, renamed to `v{version}` and only then
+    pointed to by `CURRENT`, so readers never observe a partially written index. Older versions
+    beyond `keep` are removed; processes that still map them keep working on Linux.
+    """
+    os.makedirs(snapshots_dir, exist_ok=True)
+    versions = list_snapshots(snapshots_dir)
+    version = versions[-1] + 1 if versions else 1
+    name = f'v{version:06d}'
+
+    tmp_dir = os.path.join(snapshots_dir, f'.tmp-{name}-{os.getpid()}')
+    os.makedirs(tmp_dir)
+    faiss.write_index(index, os.path.join(tmp_dir, SNAPSHOT_INDEX_FILE))
+    with open(os.path.join(tmp_dir, SNAPSHOT_META_FILE), 'w') as f:
+        json.dump({**(meta or {}), 'version': version, 'ntotal': int(index.ntotal)}, f)
+    for filename in (SNAPSHOT_INDEX_FILE, SNAPSHOT_META_FILE):
+        _fsync(os.path.join(tmp_dir, filename))
+    os.rename(tmp_dir, os.path.join(snapshots_dir, name))
+
+    current_path = os.path.join(snapshots_dir, SNAPSHOT_CURRENT_FILE)
+    with open(current_path + '.tmp', 'w') as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_path + '.tmp', current_path)
+    _fsync(snapshots_dir)
+    print(f"[FAISS] snapshot {name} published")
+
+    for old_version in list_snapshots(snapshots_dir)[:-keep]:
+        shutil.rmtree(os.path.join(snapshots_dir, f'v{old_version:06d}'), ignore_errors=True)
+
+    return version
+
+
+def load_snapshot(
+    snapshot_path: str,
+    mmap: bool = True,
+) -> Tuple[faiss.Index, dict]:
+    index = read_index(os.path.join(snapshot_path, SNAPSHOT_INDEX_FILE), mmap=mmap)
+    with open(os.path.join(snapshot_path, SNAPSHOT_META_FILE), 'r') as f:
+        meta = json.load(f)
+
+    return index, meta
+
+
+# IO_FLAG_MMAP only maps the inverted lists of IVF indexes; the flat indexes built here need
+# IO_FLAG_MMAP_IFC (faiss >= 1.10), which also maps their code arrays
+MMAP_SUPPORTED = hasattr(faiss, 'IO_FLAG_MMAP_IFC')
+
+
+def read_index(
+    index_path: str,
+    mmap: bool = True,
+) -> faiss.Index:
+    """Reads an index, memory-mapping its vectors instead of copying them into RAM when `mmap`
+    and `MMAP_SUPPORTED`. A mapped index is read-only: adding to or removing from it aborts."""
+    return faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC if mmap and MMAP_SUPPORTED else 0)
+
+
+def append_changelog(
+    changelog_path: str,
+    op: Literal['upsert', 'delete'],
+    ids: List[int],
+    embeddings: Optional[List[List[float]]] = None,
+    categories: Optional[List[str]] = None,
+) -> int:
+    """Appends one catalog change to a JSONL changelog and returns its sequence number.
+    `categories` is required for upserts replayed into an index sharded by category."""
+    if op not in ('upsert', 'delete'):
+        raise ValueError(f"Invalid changelog op: {op}")
+    if op == 'upsert' and (embeddings is None or len(embeddings) != len(ids)):
+        raise ValueError("An upsert needs one embedding per id")
+    
+    seq = last_changelog_seq(changelog_path) + 1
+    entry = {'seq': seq, 'op': op, 'ids': [int(i) for i in ids]}
+    if op == 'upsert':
+        entry['embeddings'] = np.asarray(embeddings, dtype=np.float32).tolist()
+        if categories is not None:
+            entry['categories'] = list(categories)
+    with open(changelog_path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        
+    return seq
+
+
+def last_changelog_seq(
+    changelog_path: str,
+) -> int:
+    """Sequence number of the last entry, read from the tail of the file."""
+    if not os.path.exists(changelog_path) or os.path.getsize(changelog_path) == 0:
+        return 0
+    with open(changelog_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        chunk_size = 4096
+        while True:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            lines = f.read(end - start).strip().split(b'\n')
+            if len(lines) > 1 or start == 0:
+                return json.loads(lines[-1])['seq']
+            chunk_size *= 2
+
+
+def read_changelog(
+    changelog_path: str,
+    after_seq: int = 0,
+) -> List[dict]:
+    if not os.path.exists(changelog_path):
+        return []
+    entries = []
+    with open(changelog_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if entry['seq'] > after_seq:
+                    entries.append(entry)
+                    
+    return entries
+
+
+def load_rec_embedding_dict(dataset_dir):
+    e_dir = POLYVORE_PRECOMPUTED_REC_EMBEDDING_DIR.format(polyvore_dir=dataset_dir)
+    filenames = [filename for filename in os.listdir(e_dir) if filename.endswith(".pkl")]
+    filenames = sorted(filenames, key=lambda x: int(x.split('.')[0].split('_')[-1]))
+    
+    all_ids, all_embeddings = [], []
+    for filename in filenames:
+        filepath = os.path.join(e_dir, filename)
+        with open(filepath, 'rb') as f:
+            data = pickle.load(f)
+            all_ids += data['ids']
+            all_embeddings.append(data['embeddings'])
+            
+    all_embeddings = np.concatenate(all_embeddings, axis=0)
+    print(f"Loaded {len(all_embeddings)} embeddings")
+    
+    all_embeddings_dict = {item_id: embedding for item_id, embedding in zip(all_ids, all_embeddings)}
+    print(f"Created embeddings dictionary")
+    
+    return all_embeddings_dict
\ No newline at end of file
@@ -0,0 +1,83 @@
+from itertools import chain
+from typing import Dict, List
+
+import torch
+from torch import nn
+
+from ..data.datatypes import FashionFillInTheBlankData, FashionItem
+
+
+class ItemEmbeddingCache:
+    """Lookup table of `embed_item` outputs keyed by `item_id`.
+
+    Each unique item is embedded once; later lookups only gather rows. The cache is tied to
+    the model weights it was filled with, so build a new one for every checkpoint/epoch.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        batch_size: int = 512,
+        use_precomputed_embedding: bool = True,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.use_precomputed_embedding = use_precomputed_embedding
+        self.row_of_id: Dict[int, int] = {}
+        self.table = None  # (capacity, embedding_dim), grown by doubling
+
+    def __len__(self) -> int:
+        return len(self.row_of_id)
+
+    def _append(self, embeddings: torch.Tensor):
+        n_rows, n_new = len(self.row_of_id), embeddings.shape[0]
+        if self.table is None:
+            self.table = embeddings.new_empty((max(n_new, self.batch_size), embeddings.shape[1]))
+        elif n_rows + n_new > self.table.shape[0]:
+            table = self.table.new_empty((max(n_rows + n_new, 2 * self.table.shape[0]), self.table.shape[1]))
+            table[:n_rows] = self.table[:n_rows]
+            self.table = table
+        self.table[n_rows:n_rows + n_new] = embeddings
+
+    @torch.no_grad()
+    def update(self, items: List[FashionItem]):
+        """Embeds the items whose `item_id` is not in the table yet."""
+        new_items = {}
+        for item in items:
+            if item.item_id is None:
+                raise ValueError("ItemEmbeddingCache requires items with an `item_id`.")
+            if item.item_id not in self.row_of_id:
+                new_items.setdefault(item.item_id, item)
+        new_items = list(new_items.values())
+
+        for start in range(0, len(new_items), self.batch_size):
+            batch = new_items[start:start + self.batch_size]
+            embeddings = self.model(batch, use_precomputed_embedding=self.use_precomputed_embedding) # (batch_sz, embedding_dim)
+            self._append(embeddings.detach())
+            for item in batch:
+                self.row_of_id[item.item_id] = len(self.row_of_id)
+
+    def lookup(self, item_ids: List[int]) -> torch.Tensor:
+        rows = torch.tensor([self.row_of_id[item_id] for item_id in item_ids], device=self.table.device)
+
+        return self.table.index_select(0, rows) # (len(item_ids), embedding_dim)
+
+
+@torch.no_grad()
+def fitb_predict(
+    model: nn.Module,
+    data: FashionFillInTheBlankData,
+    cache: ItemEmbeddingCache,
+) -> torch.Tensor:
+    """Predicts the answer index of a batch of fill-in-the-blank questions."""
+    n_candidates = len(data['candidates'][0])
+    candidates = list(chain.from_iterable(data['candidates'])) # (batch_sz * n_candidates)
+    cache.update(candidates)
+
+    batched_q_emb = model(data['query'], use_precomputed_embedding=cache.use_precomputed_embedding).unsqueeze(1) # (batch_sz, 1, embedding_dim)
+    batched_c_embs = cache.lookup([item.item_id for item in candidates]) # (batch_sz * n_candidates, embedding_dim)
+    batched_c_embs = batched_c_embs.view(-1, n_candidates, batched_c_embs.shape[1]) # (batch_sz, n_candidates, embedding_dim)
+
+    dists = torch.norm(batched_q_emb - batched_c_embs, dim=-1) # (batch_sz, n_candidates)
+
+    return torch.argmin(dists, dim=-1) # (batch_sz,)
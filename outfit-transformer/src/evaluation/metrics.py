@@ -2,7 +2,7 @@ import numpy as np
 import typing 
 import torch
 from sklearn.metrics import roc_auc_score
-from typing import List
+from typing import Sequence
 
 
 def compute_cir_scores(predictions: torch.Tensor, labels: torch.Tensor):
@@ -34,3 +34,22 @@ def compute_cp_scores(predictions: torch.Tensor, labels: torch.Tensor):
         'auc': auc
     }
 
+
+
+def compute_retrieval_scores(retrieved_ids: torch.Tensor, target_ids: torch.Tensor, ks: Sequence[int] = (1, 5, 10)):
+    """Recall@k, NDCG@k and MRR for queries with a single relevant item.
+    
+    retrieved_ids: (n_queries, n_retrieved) ranked item ids, target_ids: (n_queries,)
+    """
+    hits = (retrieved_ids == target_ids.unsqueeze(1)) # (n_queries, n_retrieved)
+    found = hits.any(dim=1)
+    ranks = torch.where(found, hits.float().argmax(dim=1), torch.full_like(target_ids, retrieved_ids.shape[1])) # 0-based, n_retrieved if missed
+    
+    scores = {}
+    for k in ks:
+        in_top_k = (ranks < k).float()
+        scores[f'recall@{k}'] = torch.mean(in_top_k).item()
+        scores[f'ndcg@{k}'] = torch.mean(in_top_k / torch.log2(ranks.float() + 2)).item()
+    scores['mrr'] = torch.mean(found.float() / (ranks.float() + 1)).item()
+    
+    return scores
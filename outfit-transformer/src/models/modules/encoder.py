@@ -14,6 +14,7 @@ from ...data import datatypes
 from .image_encoder import Resnet18ImageEncoder, CLIPImageEncoder
 from .text_encoder import HuggingFaceTextEncoder, CLIPTextEncoder
 from ...utils.model_utils import freeze_model, mean_pooling, aggregate_embeddings
+from ...utils import profiler
 from transformers import AutoModel, AutoTokenizer, AutoProcessor
 
 
@@ -53,6 +54,7 @@ class ItemEncoder(nn.Module):
     def image_size(self):
         return self.image_enc.image_size
 
+    @profiler.profiled('item_enc')
     def forward(self, images, texts, *args, **kwargs):        
         # Encode images and texts
         image_embeddings = self.image_enc(
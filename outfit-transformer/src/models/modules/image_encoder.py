@@ -22,6 +22,7 @@ from PIL import Image
 from typing import Dict, Any, Optional
 
 from ...utils.model_utils import freeze_model, mean_pooling
+from ...utils import profiler
 
 import numpy as np
 
@@ -112,12 +113,14 @@ class Resnet18ImageEncoder(BaseImageEncoder):
         batch_size = len(images)
         images = sum(images, [])
         
-        transformed_images = torch.stack(
-            [self.transform(image) for image in images]
-        ).to(self.device)
-        image_embeddings = self.model(
-            transformed_images
-        )
+        with profiler.record('image_enc.preprocess'):
+            transformed_images = torch.stack(
+                [self.transform(image) for image in images]
+            ).to(self.device)
+        with profiler.record('image_enc.model'):
+            image_embeddings = self.model(
+                transformed_images
+            )
         image_embeddings = image_embeddings.view(
             batch_size, -1, self.d_embed
         )
@@ -163,13 +166,15 @@ class CLIPImageEncoder(BaseImageEncoder):
         processor_kargs = processor_kargs if processor_kargs is not None else {}
         processor_kargs['return_tensors'] = 'pt'
         
-        transformed_images = self.processor(
-            images=images, **processor_kargs
-        ).to(self.device)
+        with profiler.record('image_enc.preprocess'):
+            transformed_images = self.processor(
+                images=images, **processor_kargs
+            ).to(self.device)
         
-        image_embeddings = self.model(
-            **transformed_images
-        ).image_embeds
+        with profiler.record('image_enc.model'):
+            image_embeddings = self.model(
+                **transformed_images
+            ).image_embeds
         
         image_embeddings = image_embeddings.view(
             batch_size, -1, self.d_embed
@@ -21,6 +21,7 @@ from PIL import Image
 from typing import Dict, Any, Optional
 
 from ...utils.model_utils import freeze_model, mean_pooling
+from ...utils import profiler
     
 class BaseTextEncoder(nn.Module, ABC):
     def __init__(self):
@@ -98,16 +99,18 @@ class HuggingFaceTextEncoder(BaseTextEncoder):
         
         tokenizer_kargs['return_tensors'] = 'pt'
         
-        inputs = self.tokenizer(
-            texts, **self.tokenizer_args
-        )
-        inputs = {
-            key: value.to(self.device) for key, value in inputs.items()
-        }
-        outputs = mean_pooling(
-            model_output=self.model(**inputs), 
-            attention_mask=inputs['attention_mask']
-        )
+        with profiler.record('text_enc.tokenize'):
+            inputs = self.tokenizer(
+                texts, **self.tokenizer_args
+            )
+            inputs = {
+                key: value.to(self.device) for key, value in inputs.items()
+            }
+        with profiler.record('text_enc.model'):
+            outputs = mean_pooling(
+                model_output=self.model(**inputs), 
+                attention_mask=inputs['attention_mask']
+            )
         text_embeddings = self.proj(
             outputs
         )
@@ -156,17 +159,19 @@ class CLIPTextEncoder(BaseTextEncoder):
         }
         tokenizer_kargs['return_tensors'] = 'pt'
         
-        inputs = self.tokenizer(
-            text=texts, **tokenizer_kargs
-        )
-        
-        inputs = {
-            key: value.to(self.device) for key, value in inputs.items()
-        }
+        with profiler.record('text_enc.tokenize'):
+            inputs = self.tokenizer(
+                text=texts, **tokenizer_kargs
+            )
+            
+            inputs = {
+                key: value.to(self.device) for key, value in inputs.items()
+            }
         
-        text_embeddings = self.model(
-            **inputs
-        ).text_embeds
+        with profiler.record('text_enc.model'):
+            text_embeddings = self.model(
+                **inputs
+            ).text_embeds
         
         text_embeddings = text_embeddings.view(
             batch_size, -1, self.d_embed
@@ -14,6 +14,7 @@ from ..data.datatypes import (
 )
 from .modules.encoder import ItemEncoder
 from ..utils.model_utils import get_device
+from ..utils import profiler
 
 @dataclass
 class OutfitTransformerConfig:
@@ -108,6 +109,7 @@ class OutfitTransformer(nn.Module):
     def _pad_sequences(self, sequences, pad_value, max_length):
         return [seq[:max_length] + [pad_value] * (max_length - len(seq)) for seq in sequences]
 
+    @profiler.profiled('outfit_transformer.pad_and_mask')
     def _pad_and_mask_for_outfits(self, outfits):
         max_length = self._get_max_length(outfits)
         images = self._pad_sequences(
@@ -122,6 +124,7 @@ class OutfitTransformer(nn.Module):
         
         return images, texts, torch.BoolTensor(mask).to(self.device)
     
+    @profiler.profiled('outfit_transformer.pad_and_mask')
     def _pad_and_mask_for_embs(self, embs_of_outfits):
         max_length = self._get_max_length(embs_of_outfits)
         batch_size = len(embs_of_outfits)
@@ -131,9 +134,10 @@ class OutfitTransformer(nn.Module):
         mask = []
 
         for i, embs_of_outfit in enumerate(embs_of_outfits):
-            embs_of_outfit = torch.tensor(
-                np.array(embs_of_outfit[:max_length]), dtype=torch.float
-            ).to(self.device)
+            with profiler.record('outfit_transformer.to_device'):
+                embs_of_outfit = torch.tensor(
+                    np.array(embs_of_outfit[:max_length]), dtype=torch.float
+                ).to(self.device)
             length = len(embs_of_outfit)
 
             embeddings[i, :length] = embs_of_outfit
@@ -142,6 +146,7 @@ class OutfitTransformer(nn.Module):
         
         return embeddings, torch.BoolTensor(mask).to(self.device)
     
+    @profiler.profiled('outfit_transformer.style_enc')
     def _style_enc_forward(self, embs_of_inputs, src_key_padding_mask):
         if self.cfg.aggregation_method == 'concat':
             half_d_embed = self.item_enc.d_embed // 2
@@ -154,6 +159,7 @@ class OutfitTransformer(nn.Module):
         
         return self.style_enc(normalized_embs, src_key_padding_mask=src_key_padding_mask)
     
+    @profiler.profiled('outfit_transformer.predict_score')
     def predict_score(self, query: List[FashionCompatibilityQuery], use_precomputed_embedding: bool = False) -> Tensor:
         outfits = [query_.outfit for query_ in query]
         if use_precomputed_embedding:
@@ -177,10 +183,12 @@ class OutfitTransformer(nn.Module):
         ], dim=1) # [B, L+1]
         
         last_hidden_states = self._style_enc_forward(embs_of_inputs, src_key_padding_mask=mask)
-        scores = self.predict_ffn(last_hidden_states[:, 0, :])
+        with profiler.record('outfit_transformer.predict_head'):
+            scores = self.predict_ffn(last_hidden_states[:, 0, :])
         
         return scores
     
+    @profiler.profiled('outfit_transformer.embed_query')
     def embed_query(self, query: List[FashionComplementaryQuery], use_precomputed_embedding: bool=False) -> Tensor:
         # q_items = [[FashionItem(category=i.category, image=self.image_query, description=i.category)] for i in query]
         outfits = [query_.outfit for query_ in query]
@@ -202,10 +210,12 @@ class OutfitTransformer(nn.Module):
         ], dim=1)
 
         last_hidden_states = self._style_enc_forward(embs_of_inputs, src_key_padding_mask=mask)
-        embeddings = self.embed_ffn(last_hidden_states[:, 0, :])
+        with profiler.record('outfit_transformer.embed_head'):
+            embeddings = self.embed_ffn(last_hidden_states[:, 0, :])
         
         return F.normalize(embeddings, p=2, dim=-1) if self.cfg.transformer_norm_out else embeddings
 
+    @profiler.profiled('outfit_transformer.embed_item')
     def embed_item(self, item: List[FashionItem], use_precomputed_embedding: bool=False) -> Tensor:
         if use_precomputed_embedding:
             assert all([item_.embedding is not None for item_ in item])
@@ -217,7 +227,8 @@ class OutfitTransformer(nn.Module):
             embs_of_inputs = self.item_enc(images, texts)
         
         last_hidden_states = self._style_enc_forward(embs_of_inputs, src_key_padding_mask=mask)
-        embeddings = self.embed_ffn(last_hidden_states[:, 0, :]) # [B, D]
+        with profiler.record('outfit_transformer.embed_head'):
+            embeddings = self.embed_ffn(last_hidden_states[:, 0, :]) # [B, D]
             
         return F.normalize(embeddings, p=2, dim=-1) if self.cfg.transformer_norm_out else embeddings
 
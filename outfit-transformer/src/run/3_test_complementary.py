@@ -12,6 +12,7 @@ import wandb
 
 from ..data import collate_fn
 from ..data.datasets import polyvore
+from ..evaluation.fitb import ItemEmbeddingCache, fitb_predict
 from ..evaluation.metrics import compute_cir_scores
 from ..models.load import load_model
 from ..utils.utils import seed_everything
@@ -66,16 +67,12 @@ def validation(args):
     model.eval()
     
     pbar = tqdm(test_dataloader, desc=f'[Test] Fill in the Blank')
+    cache = ItemEmbeddingCache(model, batch_size=args.batch_sz_per_gpu * 4) # Candidates are embedded once per checkpoint
     all_preds, all_labels = [], []
     for i, data in enumerate(pbar):
         if args.demo and i > 2:
             break
-        batched_q_emb = model(data['query'], use_precomputed_embedding=True).unsqueeze(1) # (batch_sz, 1, embedding_dim)
-        batched_c_embs = model(sum(data['candidates'], []), use_precomputed_embedding=True) # (batch_sz * 4, embedding_dim)
-        batched_c_embs = batched_c_embs.view(-1, 4, batched_c_embs.shape[1]) # (batch_sz, 4, embedding_dim)
-        
-        dists = torch.norm(batched_q_emb - batched_c_embs, dim=-1) # (batch_sz, 4)
-        preds = torch.argmin(dists, dim=-1) # (batch_sz,)
+        preds = fitb_predict(model, data, cache) # (batch_sz,)
         labels = torch.tensor(data['label']).cuda()
 
         # Accumulate Results
@@ -0,0 +1,172 @@
+import json
+import os
+import pathlib
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+from ..data import collate_fn
+from ..data.datasets import polyvore
+from ..demo.vectorstore import FAISSVectorStore
+from ..demo.vectorstore_utils import load_rec_embedding_dict
+from ..evaluation.metrics import compute_retrieval_scores
+from ..models.load import load_model
+from ..utils.utils import seed_everything
+
+SRC_DIR = pathlib.Path(__file__).parent.parent.parent.absolute()
+CHECKPOINT_DIR = SRC_DIR / 'checkpoints'
+RESULT_DIR = SRC_DIR / 'results'
+LOGS_DIR = SRC_DIR / 'logs'
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+os.makedirs(RESULT_DIR, exist_ok=True)
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+def parse_args():
+    parser = ArgumentParser()
+    parser.add_argument('--model_type', type=str, choices=['original', 'clip'],
+                        default='clip')
+    parser.add_argument('--polyvore_dir', type=str,
+                        default='./datasets/polyvore')
+    parser.add_argument('--polyvore_type', type=str, choices=['nondisjoint', 'disjoint'],
+                        default='nondisjoint')
+    parser.add_argument('--batch_sz_per_gpu', type=int,
+                        default=512)
+    parser.add_argument('--n_workers_per_gpu', type=int,
+                        default=4)
+    parser.add_argument('--faiss_types', type=str, nargs='+', choices=['IndexFlatIP', 'IndexFlatL2'],
+                        default=['IndexFlatIP', 'IndexFlatL2'])
+    parser.add_argument('--ks', type=int, nargs='+',
+                        default=[1, 5, 10, 50])
+    parser.add_argument('--search_batch_sz', type=int,
+                        default=2048)
+    parser.add_argument('--n_latency_queries', type=int,
+                        default=1000)
+    parser.add_argument('--seed', type=int,
+                        default=42)
+    parser.add_argument('--checkpoint', type=str,
+                        default=None)
+    parser.add_argument('--demo', action='store_true')
+
+    return parser.parse_args()
+
+
+@torch.no_grad()
+def embed_queries(args, model):
+    metadata = polyvore.load_metadata(args.polyvore_dir)
+    embedding_dict = polyvore.load_embedding_dict(args.polyvore_dir)
+
+    test = polyvore.PolyvoreTripletDataset(
+        dataset_dir=args.polyvore_dir, dataset_type=args.polyvore_type,
+        dataset_split='test', metadata=metadata, embedding_dict=embedding_dict
+    )
+    test_dataloader = DataLoader(
+        dataset=test, batch_size=args.batch_sz_per_gpu, shuffle=False,
+        num_workers=args.n_workers_per_gpu, collate_fn=collate_fn.triplet_collate_fn
+    )
+
+    all_q_embs, all_target_ids, all_query_ids = [], [], []
+    for i, data in enumerate(tqdm(test_dataloader, desc=f'[Test] Embedding Queries')):
+        if args.demo and i > 2:
+            break
+        batched_q_emb = model(data['query'], use_precomputed_embedding=True) # (batch_sz, embedding_dim)
+
+        all_q_embs.append(batched_q_emb.detach().cpu().numpy())
+        all_target_ids += [answer.item_id for answer in data['answer']]
+        all_query_ids += [[item.item_id for item in query.outfit] for query in data['query']]
+
+    return np.concatenate(all_q_embs, axis=0).astype(np.float32), all_target_ids, all_query_ids
+
+
+def evaluate_index(args, indexer, q_embs, target_ids, query_ids):
+    max_k = max(args.ks)
+    # Items of the query outfit are also in the catalog, so fetch enough extra rows to drop them.
+    search_k = max_k + max(len(ids) for ids in query_ids)
+
+    # Throughput: batched search over all queries
+    all_faiss_ids, elapsed = [], 0.
+    for start in range(0, len(q_embs), args.search_batch_sz):
+        batch = q_embs[start:start + args.search_batch_sz]
+        t = time.perf_counter()
+        _, faiss_ids = indexer.index.search(batch, k=search_k)
+        elapsed += time.perf_counter() - t
+        all_faiss_ids.append(faiss_ids)
+    all_faiss_ids = np.concatenate(all_faiss_ids, axis=0)
+
+    # Latency: one query per search call
+    latencies = []
+    for q_emb in q_embs[:args.n_latency_queries]:
+        t = time.perf_counter()
+        indexer.index.search(q_emb[None], k=search_k)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    retrieved_ids = []
+    for faiss_ids, ids in zip(all_faiss_ids.tolist(), query_ids):
+        excluded = set(ids)
+        ranked = [item_id for item_id in faiss_ids if item_id != -1 and item_id not in excluded][:max_k]
+        retrieved_ids.append(ranked + [-1] * (max_k - len(ranked)))
+
+    score = compute_retrieval_scores(
+        torch.tensor(retrieved_ids), torch.tensor(target_ids), ks=args.ks
+    )
+
+    return {
+        **score,
+        'qps': len(q_embs) / elapsed if elapsed > 0 else float('inf'),
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p99_ms': float(np.percentile(latencies, 99)),
+        'n_queries': len(q_embs),
+        'n_items': indexer.index.ntotal,
+    }
+
+
+def validation(args):
+    model = load_model(model_type=args.model_type, checkpoint=args.checkpoint)
+    model.eval()
+
+    q_embs, target_ids, query_ids = embed_queries(args, model)
+    # Item embeddings must come from the same checkpoint (see src/demo/1_generate_rec_embeddings.py)
+    rec_embedding_dict = load_rec_embedding_dict(args.polyvore_dir)
+
+    scores = {}
+    for faiss_type in args.faiss_types:
+        with tempfile.TemporaryDirectory() as base_dir:
+            indexer = FAISSVectorStore(
+                index_name='rec_index',
+                d_embed=q_embs.shape[1],
+                faiss_type=faiss_type,
+                base_dir=base_dir,
+            )
+            indexer.add(
+                embeddings=list(rec_embedding_dict.values()),
+                ids=list(rec_embedding_dict.keys())
+            )
+            scores[faiss_type] = evaluate_index(args, indexer, q_embs, target_ids, query_ids)
+        print(f"[Test] Retrieval ({faiss_type}) --> {scores[faiss_type]}")
+
+    if args.checkpoint:
+        result_dir = os.path.join(
+            RESULT_DIR, args.checkpoint.split('/')[-2],
+        )
+    else:
+        result_dir = os.path.join(
+            RESULT_DIR, 'retrieval_demo',
+        )
+    os.makedirs(
+        result_dir, exist_ok=True
+    )
+    with open(os.path.join(result_dir, f'retrieval_results.json'), 'w') as f:
+        json.dump(scores, f, indent=4)
+    print(f"[Test] Retrieval --> Results saved to {result_dir}")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    seed_everything(args.seed)
+    validation(args)
@@ -22,6 +22,7 @@ import wandb
 
 from ..data import collate_fn
 from ..data.datasets import polyvore
+from ..evaluation.fitb import ItemEmbeddingCache, fitb_predict
 from ..evaluation.metrics import compute_cir_scores, compute_cp_scores
 from ..models.load import load_model
 from ..utils.distributed_utils import cleanup, gather_results, setup
@@ -132,7 +133,7 @@ def train_step(
         batched_q_emb = model(data['query'], use_precomputed_embedding=True) # (batch_sz, embedding_dim)
         batched_a_emb = model(data['answer'], use_precomputed_embedding=True) # (batch_sz, embedding_dim)
         
-        loss = loss_fn(batched_q_emb, batched_a_emb)
+        loss, preds = loss_fn(batched_q_emb, batched_a_emb, return_preds=True) # preds: (batch_sz,)
         loss = loss / args.accumulation_steps
         
         loss.backward()
@@ -141,8 +142,6 @@ def train_step(
             optimizer.zero_grad()
             scheduler.step()
         
-        dists = torch.cdist(batched_q_emb, batched_a_emb, p=2)  # (batch_sz, batch_sz)
-        preds = torch.argmin(dists, dim=1) # (batch_sz,)
         labels = torch.arange(len(preds), device=rank)
 
         # Accumulate Results
@@ -182,17 +181,13 @@ def valid_step(
 ):
     model.eval()
     pbar = tqdm(dataloader, desc=f'Valid Epoch {epoch+1}/{args.n_epochs}')
+    cache = ItemEmbeddingCache(model, batch_size=args.batch_sz_per_gpu * 4) # Candidates are embedded once per epoch
     
     all_loss, all_preds, all_labels = torch.zeros(1, device=rank), [], []
     for i, data in enumerate(pbar):
         if args.demo and i > 2:
             break
-        batched_q_emb = model(data['query'], use_precomputed_embedding=True).unsqueeze(1) # (batch_sz, 1, embedding_dim)
-        batched_c_embs = model(sum(data['candidates'], []), use_precomputed_embedding=True) # (batch_sz * 4, embedding_dim)
-        batched_c_embs = batched_c_embs.view(-1, 4, batched_c_embs.shape[1]) # (batch_sz, 4, embedding_dim)
-        
-        dists = torch.norm(batched_q_emb - batched_c_embs, dim=-1) # (batch_sz, 4)
-        preds = torch.argmin(dists, dim=-1) # (batch_sz,)
+        preds = fitb_predict(model, data, cache) # (batch_sz,)
         labels = torch.tensor(data['label'], device=rank)
 
         # Accumulate Results
@@ -23,25 +23,29 @@ from torch.utils.data import DataLoader
 
 
 class InBatchTripletMarginLoss(nn.Module):
-    def __init__(self, margin: float = 1.0, reduction: str = "mean"):
+    def __init__(self, margin: float = 1.0, reduction: str = "mean", chunk_size: int = 1024):
         super().__init__()
         self.margin = margin
         self.reduction = reduction
+        self.chunk_size = chunk_size
         
     def forward(
-        self, batched_q_emb: Tensor, batched_a_emb: Tensor
+        self, batched_q_emb: Tensor, batched_a_emb: Tensor, return_preds: bool = False
     ):
-        batch_size = batched_q_emb.shape[0]
-        # Compute pairwise distance matrix
-        dists = torch.cdist(batched_q_emb, batched_a_emb, p=2)  # (batch_size, batch_size)
-        # Positive distances (diagonal elements: query-answer pairs)
-        pos_dists = torch.diag(dists)  # (batch_size,)
-        # Negative distances (all other pairs)
-        neg_dists = dists.clone()  # Copy distance matrix
-        neg_dists.fill_diagonal_(float('inf'))  # Ignore diagonal (positive pairs)
-        hardest_neg_dists, _ = neg_dists.min(dim=1)  # Select the hardest negative for each query
-        # Compute triplet loss
+        # Hardest negatives and top-1 predictions are searched chunk by chunk without grad,
+        # so only a (chunk_size, batch_size) distance block is alive at any time.
+        hardest_neg_idxs, hardest_neg_mask, preds = in_batch_hardest_negatives(
+            batched_q_emb, batched_a_emb, self.chunk_size
+        )
+        # Positive / hardest negative distances are recomputed on the selected pairs only.
+        # The gradient is identical to taking the min over the full distance matrix.
+        pos_dists = torch.norm(batched_q_emb - batched_a_emb, p=2, dim=-1)  # (batch_size,)
+        hardest_neg_dists = torch.norm(
+            batched_q_emb - batched_a_emb[hardest_neg_idxs], p=2, dim=-1
+        )  # (batch_size,)
+        # Compute triplet loss (queries without any negative, i.e. batch_size == 1, contribute 0)
         loss = F.relu(pos_dists - hardest_neg_dists + self.margin)
+        loss = loss.masked_fill(~hardest_neg_mask, 0.)
         
         if self.reduction == "mean":
             loss = loss.mean()
@@ -50,8 +54,35 @@ class InBatchTripletMarginLoss(nn.Module):
         else:
             raise ValueError(f"Invalid reduction mode: {self.reduction}")
 
+        if return_preds:
+            return loss, preds
+        
         return loss
 
+
+@torch.no_grad()
+def in_batch_hardest_negatives(
+    batched_q_emb: Tensor, batched_a_emb: Tensor, chunk_size: int = 1024
+) -> Tuple[Tensor, Tensor, Tensor]:
+    """Returns the hardest negative index, a mask of rows that have a negative,
+    and the in-batch top-1 prediction for each query, in a single chunked pass."""
+    batch_size = batched_q_emb.shape[0]
+    hardest_neg_idxs = torch.empty(batch_size, dtype=torch.long, device=batched_q_emb.device)
+    hardest_neg_mask = torch.empty(batch_size, dtype=torch.bool, device=batched_q_emb.device)
+    preds = torch.empty(batch_size, dtype=torch.long, device=batched_q_emb.device)
+    
+    for start in range(0, batch_size, chunk_size):
+        end = min(start + chunk_size, batch_size)
+        rows = torch.arange(end - start, device=batched_q_emb.device)
+        dists = torch.cdist(batched_q_emb[start:end], batched_a_emb, p=2)  # (chunk_size, batch_size)
+        preds[start:end] = dists.argmin(dim=1)
+        dists[rows, rows + start] = float('inf')  # Ignore diagonal (positive pairs)
+        neg_dists, neg_idxs = dists.min(dim=1)  # Select the hardest negative for each query
+        hardest_neg_idxs[start:end] = neg_idxs
+        hardest_neg_mask[start:end] = torch.isfinite(neg_dists)
+        
+    return hardest_neg_idxs, hardest_neg_mask, preds
+
 class FocalLoss(nn.Module):
     def __init__(self, gamma=2, alpha=0.5, reduction='mean'):  
         super().__init__()
@@ -0,0 +1,154 @@
+"""Lightweight stage timers for the inference hot paths.
+
+Disabled by default. Set `OUTFIT_TRANSFORMER_PROFILE=1` (or call `enable()`) to time every
+`record(...)` range; each range is also a named `torch.profiler.record_function`, so it shows up
+in Chrome traces captured with `trace(...)`. Set `OUTFIT_TRANSFORMER_PROFILE_SYNC=1` to
+synchronize CUDA at range boundaries so GPU time is attributed to the right stage.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+_enabled = os.environ.get('OUTFIT_TRANSFORMER_PROFILE', '0').lower() in ('1', 'true', 'yes')
+_sync_cuda = os.environ.get('OUTFIT_TRANSFORMER_PROFILE_SYNC', '0').lower() in ('1', 'true', 'yes')
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_lock = threading.Lock()
+_timings: Dict[str, List[float]] = defaultdict(list)
+
+# Histogram bucket upper edges in milliseconds (the last bucket is open-ended)
+HISTOGRAM_EDGES_MS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(sync_cuda: Optional[bool] = None):
+    global _enabled, _sync_cuda
+    _enabled = True
+    if sync_cuda is not None:
+        _sync_cuda = sync_cuda
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+
+
+def _synchronize():
+    if _sync_cuda and torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+class _StageTimer:
+    __slots__ = ('name', 'function_range', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        _synchronize()
+        self.function_range = torch.profiler.record_function(self.name)
+        self.function_range.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _synchronize()
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.function_range.__exit__(*exc_info)
+        with _lock:
+            _timings[self.name].append(elapsed_ms)
+        return False
+
+
+def record(name: str):
+    """Context manager timing the enclosed block as stage `name`. A shared no-op when disabled."""
+    if not _enabled:
+        return _NULL_CONTEXT
+    return _StageTimer(name)
+
+
+def profiled(name: str) -> Callable:
+    """Decorator form of `record`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _StageTimer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-stage summary statistics and latency histogram of everything recorded so far."""
+    with _lock:
+        timings = {name: np.array(values) for name, values in _timings.items()}
+
+    stats = {}
+    for name, values in sorted(timings.items()):
+        counts = np.bincount(
+            np.searchsorted(HISTOGRAM_EDGES_MS, values), minlength=len(HISTOGRAM_EDGES_MS) + 1
+        )
+        stats[name] = {
+            'count': len(values),
+            'total_ms': float(values.sum()),
+            'mean_ms': float(values.mean()),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p90_ms': float(np.percentile(values, 90)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'max_ms': float(values.max()),
+            'histogram': {
+                'edges_ms': HISTOGRAM_EDGES_MS,
+                'counts': counts.tolist(),
+            },
+        }
+
+    return stats
+
+
+def export_stats(path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(get_stats(), f, indent=4)
+    print(f"[Profiler] Stage stats saved to {path}")
+
+
+@contextlib.contextmanager
+def trace(path: str, record_shapes: bool = False):
+    """Captures a Chrome trace (chrome://tracing, Perfetto) of the enclosed block into `path`.
+
+    Stage recording is switched on for the duration of the trace.
+    """
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    was_enabled = _enabled
+    enable()
+    try:
+        with torch.profiler.profile(activities=activities, record_shapes=record_shapes) as prof:
+            yield prof
+    finally:
+        if not was_enabled:
+            disable()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    prof.export_chrome_trace(path)
+    print(f"[Profiler] Chrome trace saved to {path}")